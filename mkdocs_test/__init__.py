@@ -6,9 +6,15 @@ import yaml
 import inspect
 import subprocess
 import re
+import time
+import heapq
 from dataclasses import dataclass
-from typing import List, Dict
+from collections.abc import Mapping
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Union, Iterator, Callable
 import json
+import gzip
 import textwrap
 
 
@@ -19,20 +25,30 @@ from bs4.element import Tag as HTMLTag
 "A dictionary where the keys are also accessible with the dot notation"
 from super_collections import SuperDict
 from .common import (get_frontmatter, markdown_to_html, get_first_h1,
-                find_in_html, find_after, list_markdown_files, find_page,
-                run_command, strip_ansi_colors,
-                TEST_PLUGIN, TEST_DIRNAME, DOCS_DEFAULT_DIRNAME, PAGE_MAP,
+                find_in_html, find_in_sections, get_sections, compile_pattern,
+                Section, find_after, PageLookup, AmbiguousPageError, parse_html, check_html_parser,
+                set_html_parser, get_html_parser, HTML_PARSERS, list_markdown_files, find_page,
+                run_command, environ, strip_ansi_colors,
+                TEST_PLUGIN, TEST_DIRNAME, DOCS_DEFAULT_DIRNAME, PAGE_MAP, BUILD_INFO,
+                TRACE_FILE, LOG_FILE, TIMINGS_FILE, TIMELINE_FILE, TIMELINE_ENV,
+                TEMPLATES_FILE, MARKDOWN_PROFILE_FILE, PROFILE_FILE,
+                PAGE_INDEX, PAGES_DIRNAME, PAGE_DB,
                 h1, h2, is_in_dir)
 
 from .lorem import lorem_ipsum
+from .engine import (MKDOCS_BUILD, BUILD_MODES, 
+                     SUBPROCESS_MODE, INPROCESS_MODE, FORK_MODE, STREAM_MODE,
+                     run_subprocess, run_inprocess, run_stream)
+from .server import BuildServer, get_build_server, stop_build_server
+from .cache import BuildCache, get_build_cache, cache_key, dir_size
+from .store import PageStore
+from .grep import grep, grep_lines, GREP_HTML, GREP_MARKDOWN
+from .profiling import get_hotspots
 
 # ---------------------------
 # Initialization
 # ---------------------------
 
-"Command for build"
-MKDOCS_BUILD = ['mkdocs', 'build']
-
 
 
 def list_doc_projects(directory:str):
@@ -70,27 +86,285 @@ MySafeLoader.add_multi_constructor('', unknown_constructor)
 # Log parsing
 # ---------------------------
 
-@dataclass
-class LogEntry(object):
+"Start of a log entry: severity, source (optional) and title"
+LOG_ENTRY = re.compile(r'^([A-Z]+)[^\S\n]+-[^\S\n]+(?:\[(.*?)\][^\S\n]+-[^\S\n]+)?(.*)$',
+                       re.MULTILINE)
+
+"Source of a log message, e.g. [macros] - "
+LOG_SOURCE = re.compile(r'^\[(.*?)\]\s+-\s+(.*)')
+
+
+@dataclass(init=False, eq=False)
+class LogEntry(Mapping):
     """
     Represents a log entry
+
+    It is also a read-write mapping (as the entries of previous versions):
+    `entry['title']`, `'title' in entry`, `dict(entry)`, 
+    `entry == {...}`, etc.
+    Keys other than the fields are kept apart; they can be read
+    as attributes, but they are set as items (`entry['foo'] = ...`).
+
+    Since it is not a dict, it must be converted for JSON:
+    `json.dumps(entry.to_dict())`, or
+    `json.dumps(entries, default=LogEntry.to_dict)`.
     """
+    FIELDS = ('severity', 'source', 'title', 'payload')
+    __slots__ = FIELDS + ('_extra',)
     
     severity: str
     "Severity (DEBUG, INFO, WARNING)"
 
-    source: str = None
+    source: str
     "Source, if available (e.g. [macros])"
     
-    title: str = None
+    title: str
     "Title, first line"
 
-    payload: str = None
+    payload: str
     """
     Payload of the entry
     (following lines, not starting with DEBUG, INFO, WARNING)
     """
 
+    def __init__(self, severity:str, source:str=None, title:str=None,
+                 payload:str=None):
+        self.severity = severity
+        self.source = source
+        self.title = title
+        self.payload = payload
+
+    @classmethod
+    def from_record(cls, severity:str, message:str) -> 'LogEntry':
+        """
+        Make a log entry directly from a log record 
+        (severity and message), without parsing the trace.
+        """
+        title, _, payload = message.partition('\n')
+        source_match = LOG_SOURCE.match(title)
+        if source_match:
+            source = source_match.group(1)
+            title = source_match.group(2)
+        else:
+            source = ''
+        return cls(severity, source, title, payload.strip())
+
+    # Dictionary-style access (as for the entries of previous versions)
+    @property
+    def _extra_keys(self) -> dict:
+        "The keys that are not fields (created when first needed)"
+        try:
+            return self._extra
+        except AttributeError:
+            self._extra = {}
+            return self._extra
+
+    def __getitem__(self, key:str):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self._extra_keys[key]
+
+    def __setitem__(self, key:str, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            self._extra_keys[key] = value
+
+    def __contains__(self, key) -> bool:
+        return key in self.FIELDS or key in self._extra_keys
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.FIELDS
+        yield from self._extra_keys
+
+    def __len__(self) -> int:
+        return len(self.FIELDS) + len(self._extra_keys)
+
+    def __getattr__(self, name:str):
+        # (called only if there is no such field)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._extra_keys[name]
+        except KeyError:
+            raise AttributeError(f"'{self.__class__.__name__}' object "
+                                 f"has no attribute '{name}'")
+
+    def to_dict(self) -> dict:
+        "The entry as a dictionary (e.g. for JSON)"
+        return dict(self)
+
+
+class SpooledLogEntry(LogEntry):
+    """
+    A log entry of a trace spooled to a file: the payload 
+    is read from the file only when it is accessed
+    (unless it was set).
+    """
+    __slots__ = ('_spool', '_start', '_end', '_payload')
+
+    def __init__(self, severity:str, source:str, title:str,
+                 spool:str, start:int, end:int):
+        """
+        Arguments:
+            severity, source, title: see LogEntry
+            spool: the file of the trace
+            start, end: the offsets of the payload in the file (bytes)
+        """
+        self.severity = severity
+        self.source = source
+        self.title = title
+        self._spool = spool
+        self._start = start
+        self._end = end
+
+    @property
+    def payload(self) -> str:
+        "Payload of the entry (read from the file)"
+        if self._spool is None:
+            return self._payload
+        if self._end <= self._start:
+            return ''
+        with open(self._spool, 'rb') as f:
+            f.seek(self._start)
+            data = f.read(self._end - self._start)
+        return strip_ansi_colors(data.decode('utf-8', errors='replace')).strip()
+
+    @payload.setter
+    def payload(self, value:str):
+        # no longer read from the file
+        self._payload = value
+        self._spool = None
+
+
+def iter_log(mkdocs_log: str) -> Iterator[LogEntry]:
+    """
+    Parse the log entries, in a single pass over the trace
+    (generator). See parse_log().
+    """
+    # Remove the color ANSI codes (to avoid polluting)
+    mkdocs_log = strip_ansi_colors(mkdocs_log.strip())
+    previous = None
+    for match in LOG_ENTRY.finditer(mkdocs_log):
+        if previous:
+            # the payload is what lies between two entries
+            severity, source, title = previous.groups()
+            yield LogEntry(severity, source or '', title,
+                           mkdocs_log[previous.end():match.start()].strip())
+        previous = match
+    if previous:
+        severity, source, title = previous.groups()
+        yield LogEntry(severity, source or '', title,
+                       mkdocs_log[previous.end():].strip())
+
+
+class LogParser(object):
+    """
+    Incremental parser of a log, fed line by line (e.g. while the build
+    is running). It gives each entry as soon as it is complete,
+    i.e. when the next one starts (or at the end).
+    """
+
+    def __init__(self):
+        self.current = None
+        "The entry being parsed (its payload is not yet known)"
+        self._payload = []
+
+    def _flush(self) -> LogEntry:
+        "Complete the current entry"
+        entry = self.current
+        if entry is not None:
+            entry.payload = '\n'.join(self._payload).strip()
+        self.current = None
+        self._payload = []
+        return entry
+
+    def feed(self, line:str) -> LogEntry:
+        """
+        Parse a line of the log.
+
+        Returns:
+            The previous entry, if this line starts a new one (otherwise None)
+        """
+        match = LOG_ENTRY.match(strip_ansi_colors(line))
+        if match:
+            entry = self._flush()
+            severity, source, title = match.groups()
+            self.current = LogEntry(severity, source or '', title, '')
+            return entry
+        elif self.current is not None:
+            self._payload.append(line)
+        return None
+
+    def close(self) -> LogEntry:
+        "Complete the parsing (returns the last entry, if any)"
+        return self._flush()
+
+
+class JsonLogEntry(LogEntry):
+    """
+    A log entry recorded by the test plugin (option `json_log`),
+    with the name of the logger and the page being processed.
+    """
+    FIELDS = LogEntry.FIELDS + ('logger', 'page')
+    __slots__ = ('logger', 'page')
+
+    def __init__(self, severity:str, source:str=None, title:str=None,
+                 payload:str=None, logger:str=None, page:str=None):
+        super().__init__(severity, source, title, payload)
+        # name of the logger (e.g. mkdocs.plugins.test)
+        self.logger = logger
+        # the page being processed (src_uri), or None
+        self.page = page
+
+
+def read_json_log(filename:str) -> List[JsonLogEntry]:
+    "Read the log written by the test plugin, as JSON lines"
+    entries = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # e.g. last line, if the build was interrupted
+                continue
+            message = record['message']
+            if record.get('exc_text'):
+                message = f"{message}\n{record['exc_text']}"
+            entry = JsonLogEntry.from_record(record['level'], message)
+            entry.logger = record.get('logger')
+            entry.page = record.get('page')
+            entries.append(entry)
+    return entries
+
+
+def read_spooled_log(filename:str) -> List[SpooledLogEntry]:
+    """
+    Parse the log entries of a trace spooled to a file,
+    line by line: only the titles and the offsets of the payloads
+    are kept in memory.
+    """
+    entries = []
+    current = None
+    offset = 0
+    with open(filename, 'rb') as f:
+        for line in f:
+            match = LOG_ENTRY.match(
+                strip_ansi_colors(line.decode('utf-8', errors='replace')
+                                  .rstrip('\r\n')))
+            if match:
+                if current:
+                    current._end = offset
+                severity, source, title = match.groups()
+                current = SpooledLogEntry(severity, source or '', title,
+                                          filename, offset + len(line), 
+                                          offset + len(line))
+                entries.append(current)
+            offset += len(line)
+    if current:
+        current._end = offset
+    return entries
+
 
 def parse_log(mkdocs_log: str) -> List[LogEntry]:
     """
@@ -117,40 +391,62 @@ def parse_log(mkdocs_log: str) -> List[LogEntry]:
         - title: the remnant of the first line, e.g. "Page title: Home"
         - payload: the rest of the message
     """
-    log_entries = []
-    current_entry = None
-    mkdocs_log = mkdocs_log.strip()
-    # Remove the color ANSI codes (to avoid polluting)
-    mkdocs_log = strip_ansi_colors(mkdocs_log)
+    return list(iter_log(mkdocs_log))
+
+class LogIndex(object):
+    """
+    Index of the entries of a log, by severity and by source
+    (built once), for fast queries.
+    """
+
+    def __init__(self, entries:List[LogEntry]):
+        self.entries = entries
+        self.by_severity = {}
+        self.by_source = {}
+        for i, entry in enumerate(entries):
+            self.by_severity.setdefault(entry.severity, []).append(i)
+            self.by_source.setdefault(entry.source or '', []).append(i)
+
+    def find(self, title:str='', source:str='', 
+             severity:str='') -> Iterator[int]:
+        """
+        Find the entries that match the criteria
+        (see DocProject.find_entries()).
+
+        Returns:
+            The positions of the entries in the log (generator, in order)
+        """
+        severity = severity.upper()
+        if source:
+            source_regex = compile_pattern(source)
+            sources = {key for key in self.by_source if source_regex.search(key)}
+        # start from the smallest set of candidates
+        if severity:
+            positions = self.by_severity.get(severity, [])
+        elif source:
+            positions = heapq.merge(*(self.by_source[key] for key in sources))
+        else:
+            positions = range(len(self.entries))
+        title_regex = compile_pattern(title) if title else None
+        for i in positions:
+            entry = self.entries[i]
+            if source and (entry.source or '') not in sources:
+                continue
+            if title_regex and not title_regex.search(entry.title or ''):
+                continue
+            yield i
+
+    def counts(self, by:str='severity') -> Dict[str, int]:
+        "The number of entries, by severity or by source"
+        if by == 'severity':
+            index = self.by_severity
+        elif by == 'source':
+            index = self.by_source
+        else:
+            raise ValueError(f"Cannot count by '{by}' "
+                             "(must be 'severity' or 'source')")
+        return {key: len(positions) for key, positions in index.items()}
 
-    for line in mkdocs_log.split('\n'):
-        match = re.match(r'^([A-Z]+)\s+-\s+(.*)', line)
-        if match:
-            if current_entry:
-                log_entries.append(current_entry)
-            severity = match.group(1)
-            message = match.group(2)
-            source_match = re.match(r'^\[(.*?)\]\s+-\s+(.*)', message)
-            if source_match:
-                source = source_match.group(1)
-                title = source_match.group(2)
-            else:
-                source = ''
-                title = message
-            current_entry = {'severity': severity, 
-                             'source': source, 
-                             'title': title,
-                             'payload': []}
-        elif current_entry:
-            # current_entry['payload'] += '\n' + line
-            current_entry['payload'].append(line)
-    if current_entry:
-        log_entries.append(current_entry)
-
-    # Transform the payloads into str:
-    for entry in log_entries:
-        entry['payload'] = '\n'.join(entry['payload']).strip()
-    return [SuperDict(item) for item in log_entries]
 
 # ---------------------------
 # An Mkdocs Documentation project
@@ -160,18 +456,62 @@ class MkDocsPage(SuperDict):
 
     MANDATORY_ATTRS = ['markdown', 'content', 'meta', 'file']
 
-    def __init__(self, page:dict):
+    def __init__(self, page:dict, parser:str=None, output_file:str=None):
+        """
+        Arguments:
+            page: the record of the page, exported by the test plugin
+            parser: the HTML parser (default: see set_html_parser())
+            output_file: the copy of the final HTML page, exported by the
+                test plugin (option `output`), possibly compressed (.gz)
+        """
         # Call the superclass's __init__ method
         super().__init__(page)
         for field in self.MANDATORY_ATTRS:
             if field not in self:
                 raise AttributeError(f"Missing attribute '{field}'")
+        self._parser = parser
+        self._output_file = output_file
 
 
 
     
 
 
+    @property
+    def record(self) -> dict:
+        """
+        The page, as exported by the test plugin
+        (without the attributes cached by the page object).
+        """
+        return {key: value for key, value in self.items() 
+                if not key.startswith('_')}
+
+    @property
+    def parser(self) -> str:
+        "The HTML parser used for this page"
+        return self._parser or get_html_parser()
+
+    @property
+    def render_time(self) -> float:
+        """
+        The time spent rendering the templates of the page (seconds),
+        if the templates were profiled (option `templates` 
+        of the test plugin); otherwise None.
+        """
+        return self.get('render_time')
+
+    @property
+    def markdown_profile(self) -> SuperDict:
+        """
+        The time spent in each processor of the markdown extensions,
+        when converting the page (option `markdown_profile` of the 
+        test plugin): registry -> processor -> seconds 
+        (the registries are preprocessors, blockprocessors, 
+        inlinepatterns, treeprocessors, postprocessors); 
+        otherwise None.
+        """
+        return self.get('markdown_profile')
+
     @property
     def h1(self):
         "First h1 in the markdown"
@@ -186,7 +526,7 @@ class MkDocsPage(SuperDict):
         try:
             return self._plain_text
         except AttributeError:
-            soup = BeautifulSoup(self.content, "html.parser")
+            soup = parse_html(self.content, self.parser)
             self._plain_text = soup.get_text()
             return self._plain_text
 
@@ -196,13 +536,23 @@ class MkDocsPage(SuperDict):
         """
         The final HTML code that will be displayed,
         complete with javascript, etc. (the end product).
+
+        It is read from the copy exported by the test plugin, if available
+        (otherwise from the site directory).
         """
         try:
             return self._html
         except AttributeError:
             try:
-                with open(self.file.abs_dest_path, 'r') as f:
-                    s = f.read()
+                if self._output_file and self._output_file.endswith('.gz'):
+                    with gzip.open(self._output_file, 'rt', encoding='utf-8') as f:
+                        s = f.read()
+                elif self._output_file:
+                    with open(self._output_file, 'r', encoding='utf-8') as f:
+                        s = f.read()
+                else:
+                    with open(self.file.abs_dest_path, 'r') as f:
+                        s = f.read()
                 self._html = s
                 return self._html
             except AttributeError as e:
@@ -265,25 +615,48 @@ class MkDocsPage(SuperDict):
         Returns:
             The line where the pattern was found, or None
         """
-        # it operates on the html
-        return find_in_html(self.html,
-                            pattern=pattern, 
-                            header=header, header_level=header_level)
+        # it operates on the html, parsed once
+        if header:
+            return find_in_sections(self.sections, '',
+                                    pattern=pattern, 
+                                    header=header, header_level=header_level)
+        try:
+            full_text = self._full_text
+        except AttributeError:
+            self._full_text = self.soup.get_text(separator='\n', strip=True)
+            full_text = self._full_text
+        return find_in_sections([], full_text, pattern=pattern)
 
     @property
     def soup(self) -> BeautifulSoup:
         """
         Parsed content of the HTML page (as published).
         
+        The HTML parser is `parser` (html.parser, lxml, html5lib).
+
         Returns:
             Soup object from BeautifulSoup    
         """
         try:
             return self._soup
         except AttributeError:
-            self._soup = BeautifulSoup(self.html, 'html.parser')
+            self._soup = parse_html(self.html, self.parser)
             return self._soup
 
+    @property
+    def sections(self) -> List[Section]:
+        """
+        Index of the sections of the HTML page (as published): 
+        for each header, its level, id, title 
+        and the text until the next header.
+        It is built once, from the soup.
+        """
+        try:
+            return self._sections
+        except AttributeError:
+            self._sections = get_sections(self.soup)
+            return self._sections
+
 
     def find_all(self, tag: str, *args, **kwargs) -> List[HTMLTag]:
         """
@@ -321,23 +694,68 @@ class MkDocsPage(SuperDict):
         return self.soup.find(tag, *args, **kwargs)
     
 
+    @property
+    def outline(self) -> List[SuperDict]:
+        """
+        The outline of the page (table of contents), exported 
+        by the test plugin: a tree of headers, each with its 
+        `level`, `id`, `title`, `line` (in the markdown, or None)
+        and `children`.
+
+        If it was not exported, it is made from the sections of the
+        HTML page (without the lines).
+        """
+        try:
+            return self._outline
+        except AttributeError:
+            pass
+        outline = self.get('outline')
+        if outline is None:
+            # build the tree from the (flat) sections
+            outline = []
+            parents = []
+            for section in self.sections:
+                item = {'level': section.level, 'id': section.id,
+                        'title': section.title, 'line': None,
+                        'children': []}
+                while parents and parents[-1]['level'] >= section.level:
+                    parents.pop()
+                (parents[-1]['children'] if parents else outline).append(item)
+                parents.append(item)
+        self._outline = [SuperDict(item) for item in outline]
+        return self._outline
+
+    @property
+    def headers(self) -> List[SuperDict]:
+        "The headers of the outline, as a flat list (in order)"
+        headers = []
+        def walk(items):
+            for item in items:
+                headers.append(item)
+                walk(item.children)
+        walk(self.outline)
+        return headers
+
     def find_header(self, pattern: str, header_level:int=None) -> str: 
         """
-        Finds a header in the 
+        Finds a header in the page (regex, case-sensitive).
+
+        The headers of the outline are searched first (no parsing 
+        of the HTML); if none matches, all the headers of the HTML page,
+        including those that are not in the table of contents 
+        (deeper than `toc_depth`, or from the theme).
 
         Returns:
             The first header (h1, h2, h3...) that matches a pattern;
             otherwise None
         """
-        if header_level is None:
-            criterion = re.compile(r'h[1-6]')
-        else:
-            criterion = f'h{header_level}'
-        headers = self.soup.find_all(criterion,
-                                    string=re.compile(pattern))
-        r = [header.text for header in headers]
-        if len(r):
-            return r[0]
+        regex = compile_pattern(pattern, 0)
+        for headers in (self.headers, self.sections):
+            for header in headers:
+                if header_level is not None and header.level != header_level:
+                    continue
+                if regex.search(header.title):
+                    return header.title
 
 
 
@@ -392,6 +810,95 @@ class MkDocsPage(SuperDict):
 
 
 
+class PageMap(Mapping):
+    """
+    The pages produced by the build, as a read-only mapping
+    (src_uri -> MkDocsPage).
+
+    Each page is exported by the test plugin into its own file,
+    and it is loaded only when it is first accessed.
+    """
+
+    def __init__(self, index:Dict[str, dict], directory:str,
+                 previous:Dict[str, MkDocsPage]=None, parser:str=None):
+        """
+        Arguments:
+            index: the index of the pages (src_uri -> entry, with the
+                record file, the source path and the destination path);
+                the pages that were not exported have no record file
+            directory: the directory of the record files
+            previous: the page objects of a previous build,
+                to be kept if their record did not change
+            parser: the HTML parser of the pages
+        """
+        self._index = {key: entry for key, entry in index.items()
+                       if entry.get('record')}
+        self._skipped = {key: entry for key, entry in index.items()
+                         if not entry.get('record')}
+        self._directory = directory
+        self._previous = previous or {}
+        self._parser = parser
+        self._loaded = {}
+
+    @property
+    def loaded(self) -> Dict[str, MkDocsPage]:
+        "The pages loaded so far"
+        return self._loaded
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        """
+        The index of the pages (src_uri -> entry), 
+        with the record file (`record`), the source path (`src_path`)
+        and the destination path (`dest_path`).
+        """
+        return self._index
+
+    @property
+    def skipped(self) -> Dict[str, dict]:
+        """
+        The pages of the site that were not exported 
+        (options `include`, `exclude` and `flag` of the test plugin):
+        src_uri -> entry, with the source path (`src_path`) and 
+        the destination path (`dest_path`).
+        """
+        return self._skipped
+
+    def __getitem__(self, key:str) -> MkDocsPage:
+        try:
+            return self._loaded[key]
+        except KeyError:
+            record_file = os.path.join(self._directory, 
+                                       self._index[key]['record'])
+            with open(record_file, 'r') as f:
+                record = json.load(f)
+            page = self._previous.pop(key, None)
+            if page is None or page.record != record:
+                output = self._index[key].get('output')
+                if output:
+                    output = os.path.join(self._directory, output)
+                page = MkDocsPage(record, parser=self._parser, 
+                                  output_file=output)
+            self._loaded[key] = page
+            return page
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return (f"<{self.__class__.__name__}: {len(self)} pages, "
+                f"{len(self._loaded)} loaded>")
+
+
+
+
+
 class DocProject(object):
     """
     An object that describes the current MkDocs project being tested
@@ -399,7 +906,7 @@ class DocProject(object):
     """
 
     def __init__(self, project_dir:str='', path:str='', 
-                 new:bool=False):
+                 new:bool=False, parser:str=None):
         """
         Initialize the documentation project.
 
@@ -414,6 +921,8 @@ class DocProject(object):
             new: create the project dir if it does not exist.
                 (without clearing it)
                 If you use the make_config() method, the docs_dir MUST be 'docs'.
+            parser: the HTML parser for the pages (html.parser, lxml, 
+                html5lib); default: see set_html_parser().
 
         Note:
             It does not perform any build. The `build()` method must
@@ -426,6 +935,7 @@ class DocProject(object):
             path = os.path.abspath(path)
         project_dir = os.path.join(path, project_dir)
         self._project_dir = project_dir
+        self._parser = parser and check_html_parser(parser)
         if not os.path.isdir(self._project_dir):
             if new:
                 # create
@@ -442,6 +952,11 @@ class DocProject(object):
         if not self._project_dir:
             raise FileNotFoundError("This project is deleted and no longer has a project directory.")
         return self._project_dir
+
+    @property
+    def parser(self) -> str:
+        "The HTML parser used for the pages"
+        return self._parser or get_html_parser()
     
     @property
     def docs_dir(self):
@@ -536,7 +1051,10 @@ class DocProject(object):
         if plugins is None:
             final_config['plugins'] = ['search', TEST_PLUGIN]
         else:
-            if TEST_PLUGIN not in plugins:
+            # (the plugin may be declared with options, as a dictionary)
+            names = [list(plugin)[0] if isinstance(plugin, dict) else plugin
+                     for plugin in plugins]
+            if TEST_PLUGIN not in names:
                 final_config['plugins'].append(TEST_PLUGIN)
 
         # Pretty-print YAML with indentation and ordering preserved
@@ -692,7 +1210,15 @@ class DocProject(object):
 
 
     def build(self, strict:bool=False,
-              verbose:bool=False) -> subprocess.CompletedProcess:
+              verbose:bool=False,
+              mode:str=SUBPROCESS_MODE,
+              cache:Union[bool, BuildCache]=False,
+              incremental:bool=False,
+              stop_if:Callable[[LogEntry], bool]=None,
+              spool:bool=False,
+              trace:bool=False,
+              profile:bool=False,
+              cache_paths:List[str]=None) -> subprocess.CompletedProcess:
         """
         Build the documentation, to perform the tests
         (equivalent to `mkdocs build`).
@@ -701,22 +1227,204 @@ class DocProject(object):
         Arguments:
             strict: to make the build fail in case of warnings
             verbose: to generate the target_files directory
+            mode: how the build is run:
+                'subprocess' (default): the `mkdocs build` command;
+                'inprocess': MkDocs' build API, called from
+                the current interpreter (faster, since mkdocs and the plugins
+                are imported only once);
+                'fork': the build is done in a clean process, forked
+                from a warm build server (as fast, but isolated;
+                POSIX only);
+                'stream': the `mkdocs build` command, whose log is parsed
+                while the build is running (see `stop_if`).
+            cache: if True (or a BuildCache object), and nothing has changed
+                since a previous build (sources, config file, hooks, versions
+                of mkdocs and plugins), the site and test directories are 
+                restored from the cache, instead of running MkDocs.
+                The sources of the plugins installed from a local directory
+                (e.g. in editable mode) are hashed too. 
+                Only the successful builds are kept.
+            incremental: rebuild only the pages whose source changed
+                since the last build (as `mkdocs build --dirty`); 
+                the page map is updated accordingly and only the pages 
+                that changed are reloaded.
+                Note that MkDocs issues a warning for a dirty build 
+                (hence it fails in strict mode).
+            stop_if: (stream mode) a predicate on each log entry; 
+                when it is true, the build is stopped at once 
+                (the log read so far is available), e.g.
+                `lambda entry: entry.severity == 'WARNING'`.
+                It is called when the entry starts (with an empty payload)
+                and again when it is complete.
+            spool: (subprocess and stream modes) write the trace into
+                a file of the test directory, instead of keeping it 
+                in memory; the log entries then read their payload 
+                from that file, when it is accessed 
+                (for very large logs, e.g. verbose builds).
+            trace: make the test plugin record the timeline of the build
+                (phases, pages and plugins), in the Chrome trace-event
+                format (see `timeline_file`).
+            profile: run the build under cProfile (in all modes);
+                the stats are written into a file of the test directory
+                (see `profile_file` and `profile_hotspots()`).
+            cache_paths: (with cache) other files or directories read
+                by the build, relative to the project directory
+                (e.g. the data files of a plugin); a change in them 
+                invalidates the cache.
 
         Returns:
             (if desired) the low level result of the process (return code and stderr). 
             This info is generally not needed, since, those values are stored, and parsed.
         """
+        if mode not in BUILD_MODES:
+            raise ValueError(f"Unknown build mode '{mode}' "
+                             f"(must be one of {BUILD_MODES})")
+        if stop_if and mode != STREAM_MODE:
+            raise ValueError(f"A predicate for stopping the build requires "
+                             f"the '{STREAM_MODE}' mode")
+        if spool and mode not in (SUBPROCESS_MODE, STREAM_MODE):
+            raise ValueError(f"Cannot spool the trace in '{mode}' mode "
+                             f"(must be '{SUBPROCESS_MODE}' or '{STREAM_MODE}')")
         os.chdir(self.project_dir)
-        command = MKDOCS_BUILD.copy()
-        assert '--strict' not in command
-        if strict:
-            command.append('--strict')
-        if verbose:
-            command.append('--verbose')
-        print("BUILD COMMAND:", command)
-        self._build_result = run_command(*command)
+        if incremental and not os.path.isfile(self.page_index_file):
+            # nothing to update: full build
+            incremental = False
+        previous_pages = self.__dict__.get('_pages') if incremental else None
+        self._clear_build_data()
+        if previous_pages:
+            # only the pages already loaded
+            self._previous_pages = dict(previous_pages.loaded 
+                                        if isinstance(previous_pages, PageMap)
+                                        else previous_pages)
+        if cache:
+            if cache is True:
+                cache = get_build_cache()
+            key = cache_key(self.project_dir, self.config_file, self.config,
+                            extra_paths=cache_paths, 
+                            strict=strict, verbose=verbose, mode=mode,
+                            dirty=incremental, spool=spool, trace=trace, 
+                            profile=profile)
+            site_dir = self.config.get('site_dir', 'site')
+            start = time.perf_counter()
+            stored = cache.get(key, self.project_dir, site_dir)
+            if stored:
+                print("BUILD (from cache):", stored['args'])
+                self._build_result = subprocess.CompletedProcess(
+                                        stored['args'], stored['returncode'],
+                                        stdout=stored['stdout'],
+                                        stderr=stored['stderr'])
+                if (stored['records'] is not None and 
+                        not os.path.isfile(self.log_file)):
+                    self._log = [LogEntry.from_record(*record)
+                                 for record in stored['records']]
+                restore_duration = time.perf_counter() - start
+                self._save_build_info(mode=mode, duration=stored['duration'],
+                                      cache='hit',
+                                      restore_duration=restore_duration,
+                                      stats=self._get_build_stats(restore_duration))
+                return self.build_result
+
+        start = time.perf_counter()
+        records = None
+        stopped = False
+        spool_file = self.trace_file if spool else None
+        for filename in (self.log_file, self.profile_file):
+            if os.path.isfile(filename):
+                # (from a previous build)
+                os.remove(filename)
+        profile_file = self.profile_file if profile else None
+        # (the environment of the build, e.g. for the test plugin)
+        env = {TIMELINE_ENV: '1' if trace else None}
+        if mode == FORK_MODE:
+            # started outside of that environment, which it would keep
+            get_build_server().start()
+        with environ(env):
+            if mode == INPROCESS_MODE:
+                self._build_result, records = run_inprocess(self.config_file,
+                                                            strict=strict,
+                                                            verbose=verbose,
+                                                            dirty=incremental,
+                                                            profile=profile_file)
+            elif mode == FORK_MODE:
+                server = get_build_server()
+                self._build_result, records, page_index = server.build(
+                                                            self.project_dir,
+                                                            self.config_file,
+                                                            strict=strict,
+                                                            verbose=verbose,
+                                                            dirty=incremental,
+                                                            env=env,
+                                                            profile=profile_file)
+                if page_index is not None:
+                    self._pages = self._make_page_map(page_index)
+            elif mode == STREAM_MODE:
+                parser = LogParser()
+                entries = []
+                def on_line(line:str) -> bool:
+                    "Parse the line; stop if an entry fulfills the predicate"
+                    current = parser.current
+                    entry = parser.feed(line)
+                    if entry is not None and not spool:
+                        entries.append(entry)
+                    if not stop_if:
+                        return False
+                    # an entry is tested when it starts and when it is complete
+                    return bool((entry is not None and stop_if(entry)) or
+                                (parser.current is not current and 
+                                 stop_if(parser.current)))
+                self._build_result, stopped = run_stream(strict=strict, 
+                                                         verbose=verbose,
+                                                         dirty=incremental,
+                                                         on_line=on_line,
+                                                         spool=spool_file,
+                                                         profile=profile_file,
+                                                         cwd=self.project_dir)
+                entry = parser.close()
+                if not spool:
+                    if entry is not None:
+                        entries.append(entry)
+                    self._log = entries
+            else:
+                self._build_result = run_subprocess(strict=strict, verbose=verbose,
+                                                    dirty=incremental,
+                                                    spool=spool_file,
+                                                    profile=profile_file,
+                                                    cwd=self.project_dir)
+        duration = time.perf_counter() - start
+        if records is not None:
+            # the log entries are made directly from the records
+            self._log = [LogEntry.from_record(*record) for record in records]
+        if os.path.isfile(self.log_file):
+            # the log written by the test plugin has precedence
+            self.__dict__.pop('_log', None)
+
+        stats = self._get_build_stats(duration)
+        if stopped:
+            self._save_build_info(mode=mode, duration=duration, stopped=True,
+                                  stats=stats)
+        elif cache:
+            result = self.build_result
+            if result.returncode == 0:
+                # (a failure may be transient: it is not kept)
+                cache.put(key, self.project_dir, site_dir,
+                          {'args': result.args, 'returncode': result.returncode,
+                           'stdout': result.stdout, 'stderr': result.stderr,
+                           'records': records, 'duration': duration})
+            self._save_build_info(mode=mode, duration=duration, cache='miss',
+                                  stats=stats)
+        else:
+            self._save_build_info(mode=mode, duration=duration, stats=stats)
         return self.build_result
 
+    def _clear_build_data(self):
+        "Clear the data cached from a previous build"
+        store = self.__dict__.get('_page_store')
+        if store:
+            store.close()
+        for attr in ('_build_result', '_log', '_log_index', '_pages',
+                     '_previous_pages', '_page_store', '_page_lookup'):
+            self.__dict__.pop(attr, None)
+
 
     # ----------------------------------
     # Post-build properties
@@ -737,6 +1445,199 @@ class DocProject(object):
         "Was the execution of the build a success?"
         return self.build_result.returncode == 0
 
+    @property
+    def build_info_file(self) -> str:
+        "The file containing the information on the last build"
+        return os.path.join(self.test_dir, BUILD_INFO)
+
+    def _save_build_info(self, **kwargs):
+        "Record the information on the build that just took place"
+        info = {'returncode': self.build_result.returncode, **kwargs}
+        os.makedirs(self.test_dir, exist_ok=True)
+        with open(self.build_info_file, 'w') as f:
+            json.dump(info, f, indent=4)
+
+    @property
+    def build_info(self) -> SuperDict:
+        """
+        Information on the last build (returncode, mode, duration in seconds,
+        cache 'hit' or 'miss' if the cache was used, stats),
+        even if it took place in a previous session.
+        Empty if the project was never built.
+        """
+        try:
+            with open(self.build_info_file, 'r') as f:
+                return SuperDict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return SuperDict()
+
+    def _get_build_stats(self, wall:float) -> dict:
+        "Measure the resources used by the build that just took place"
+        usage = getattr(self.build_result, 'usage', None) or {}
+        max_rss = usage.get('max_rss')
+        pages = None
+        if os.path.isfile(self.page_index_file):
+            with open(self.page_index_file, 'r') as f:
+                pages = len(json.load(f))
+        site_dir = os.path.join(self.project_dir,
+                                self.config.get('site_dir', 'site'))
+        return {'wall': wall,
+                'user_cpu': usage.get('user_cpu'),
+                'sys_cpu': usage.get('sys_cpu'),
+                'peak_rss_mb': max_rss / 2**20 if max_rss is not None else None,
+                'pages': pages,
+                'site_bytes': dir_size(site_dir)}
+
+    @property
+    def build_stats(self) -> SuperDict:
+        """
+        The resources used by the last build:
+
+        - wall: wall clock time (seconds)
+        - user_cpu, sys_cpu: CPU time of the build (seconds)
+        - peak_rss_mb: peak memory (resident set size, in MB)
+        - pages: number of pages (if exported by the test plugin)
+        - site_bytes: the size of the site directory (bytes)
+
+        The CPU and memory are those of the build process
+        (subprocess, stream and fork modes), or of the current process
+        (inprocess mode: the peak memory is then that of the whole session).
+        They are None if not available (e.g. on Windows, or
+        if the build was restored from the cache).
+        """
+        return SuperDict(self.build_info.get('stats') or {})
+
+    @property
+    def timings_file(self) -> str:
+        "The timings of the plugins, written by the test plugin (option `timings`)"
+        return os.path.join(self.test_dir, TIMINGS_FILE)
+
+    @property
+    def plugin_timings(self) -> SuperDict:
+        """
+        The time spent in the event handlers of each plugin,
+        during the last build (option `timings` of the test plugin):
+        plugin -> event -> calls, total, p50, p95, max (seconds).
+
+        e.g. `project.plugin_timings['macros']['on_page_markdown'].p95`
+
+        Empty if the plugins were not timed.
+        """
+        try:
+            with open(self.timings_file, 'r') as f:
+                return SuperDict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return SuperDict()
+
+    @property
+    def templates_file(self) -> str:
+        "The profile of the templates, written by the test plugin (option `templates`)"
+        return os.path.join(self.test_dir, TEMPLATES_FILE)
+
+    @property
+    def template_profile(self) -> SuperDict:
+        """
+        The profile of the templates of the theme (Jinja2), during the 
+        last build (options `templates` and `bytecode_cache` of the 
+        test plugin):
+
+        - templates: template name -> calls, total, p50, p95, max 
+          (rendering, in seconds) and load (compilation 
+          or loading from the bytecode cache, in seconds)
+        - pages: src_uri -> render time (seconds)
+        - bytecode_cache: hits, misses, load_time and saved 
+          (the compile time saved, in seconds), or None
+
+        Empty if the templates were not profiled.
+        """
+        try:
+            with open(self.templates_file, 'r') as f:
+                return SuperDict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return SuperDict()
+
+    @property
+    def markdown_profile_file(self) -> str:
+        """
+        The profile of the markdown conversion, written by the test plugin 
+        (option `markdown_profile`)
+        """
+        return os.path.join(self.test_dir, MARKDOWN_PROFILE_FILE)
+
+    @property
+    def markdown_ranking(self) -> List[SuperDict]:
+        """
+        The processors of the markdown extensions, the slowest first, 
+        over all the pages of the last build (option `markdown_profile` 
+        of the test plugin): registry, name, module, total (seconds),
+        pages (number), max and slowest_page.
+
+        Empty if the markdown conversion was not profiled.
+        """
+        try:
+            with open(self.markdown_profile_file, 'r') as f:
+                ranking = json.load(f)['ranking']
+        except (FileNotFoundError, ValueError):
+            return []
+        return [SuperDict(item) for item in ranking]
+
+    @property
+    def profile_file(self) -> str:
+        """
+        The stats of cProfile for the last build (`build(profile=True)`);
+        they can be read with the `pstats` module, or tools such as 
+        snakeviz.
+        """
+        return os.path.join(self.test_dir, PROFILE_FILE)
+
+    def profile_hotspots(self, n:int=20) -> SuperDict:
+        """
+        The hotspots of the last build (`build(profile=True)`).
+
+        Arguments:
+            n: the number of functions
+
+        Returns:
+            - total: the total time (seconds)
+            - cumulative: the top n functions by cumulative time
+            - self: the top n functions by self time
+              (function, file, line, package, calls, tottime, cumtime)
+            - packages: the packages (mkdocs, markdown, jinja2, plugins,
+              'project' for the hooks, 'stdlib', etc.), by self time 
+              (package, tottime, calls, functions)
+        """
+        if not os.path.isfile(self.profile_file):
+            raise FileNotFoundError(f"No profile of the build "
+                                    f"(not built with profile=True): "
+                                    f"{self.profile_file}")
+        return SuperDict(get_hotspots(self.profile_file, n, self.project_dir))
+
+    @property
+    def timeline_file(self) -> str:
+        """
+        The timeline of the last build (`build(trace=True)` or option
+        `timeline` of the test plugin), in the Chrome trace-event format:
+        it can be loaded into Perfetto (https://ui.perfetto.dev) 
+        or chrome://tracing.
+        """
+        return os.path.join(self.test_dir, TIMELINE_FILE)
+
+    @property
+    def timeline(self) -> List[SuperDict]:
+        """
+        The spans of the timeline of the last build (trace events),
+        in chronological order: name, cat ('phase' or 'plugin'), 
+        ts and dur (microseconds), args (page, plugin).
+
+        Empty if no timeline was recorded.
+        """
+        try:
+            with open(self.timeline_file, 'r') as f:
+                events = json.load(f)['traceEvents']
+        except (FileNotFoundError, ValueError):
+            return []
+        return [SuperDict(event) for event in events if event['ph'] == 'X']
+
 
 
 
@@ -751,24 +1652,185 @@ class DocProject(object):
         if not os.path.isfile(filename):
             raise FileNotFoundError("The pagemap file was not found. " 
                         "Did you forget to declare the `test` plugin "
-                        "in the MkDocs config file?")
+                        "in the MkDocs config file "
+                        "(or is its option `page_map` false)?")
         return filename
 
+    @property
+    def page_index_file(self) -> str:
+        "The index of the pages exported by the Test plugin (one file per page)"
+        return os.path.join(self.test_dir, PAGE_INDEX)
+
     @property
     def pages(self) -> Dict[str, MkDocsPage]:
         """
         The dictionary containing the pages 
         (Markdown + HTML + ...) produced by the build.
+
+        It is a mapping where each page is loaded 
+        only when it is accessed.
         """
         try:
             return self._pages
         except AttributeError:
             # build the pages
-            with open(self.page_map_file, 'r') as file:
-                pages = json.load(file)
-            self._pages = {key: MkDocsPage(value) for key, value in pages.items()}
+            if os.path.isfile(self.page_index_file):
+                with open(self.page_index_file, 'r') as file:
+                    index = json.load(file)
+                self._pages = self._make_page_map(index)
+            else:
+                # all pages in one file
+                with open(self.page_map_file, 'r') as file:
+                    pages = json.load(file)
+                self._pages = self._make_pages(pages)
             return self._pages
+
+    def _make_page_map(self, index:dict) -> 'PageMap':
+        "Make the pages (lazy) from the index exported by the test plugin"
+        return PageMap(index, os.path.join(self.test_dir, PAGES_DIRNAME),
+                       previous=self.__dict__.pop('_previous_pages', {}),
+                       parser=self._parser)
+
+    def _make_pages(self, page_map:dict) -> Dict[str, MkDocsPage]:
+        """
+        Make the pages from the page map exported by the test plugin
+        (all pages in one file).
+
+        After an incremental build, the page objects of the previous 
+        build are kept if the page did not change 
+        (with their cached soup, html, etc.).
+        """
+        previous = self.__dict__.pop('_previous_pages', {})
+        pages = {}
+        for key, value in page_map.items():
+            page = previous.get(key)
+            if page is None or page.record != value:
+                page = MkDocsPage(value, parser=self._parser)
+            pages[key] = page
+        return pages
         
+    # ----------------------------------
+    # SQLite store of the pages
+    # (option `sqlite` of the test plugin)
+    # ----------------------------------
+
+    @property
+    def db_file(self) -> str:
+        "The SQLite database of the pages exported by the Test plugin"
+        filename = os.path.join(self.test_dir, PAGE_DB)
+        if not os.path.isfile(filename):
+            raise FileNotFoundError("The database of the pages was not found. "
+                        "Did you set the `sqlite` option of the `test` plugin "
+                        "in the MkDocs config file?")
+        return filename
+
+    @property
+    def page_store(self) -> PageStore:
+        "The SQLite store of the pages"
+        try:
+            return self._page_store
+        except AttributeError:
+            self._page_store = PageStore(self.db_file)
+            return self._page_store
+
+    def query(self, sql:str, params=()) -> List[SuperDict]:
+        """
+        Execute an SQL query on the database of the pages.
+        
+        The `pages` table has the following columns: 
+        src_uri, title, meta (JSON), markdown, content (HTML), 
+        dest_path and size (of the HTML page, in bytes).
+
+        Arguments:
+            sql: the SQL query
+            params: the parameters of the query (for `?` placeholders)
+
+        Returns:
+            The rows (a dictionary per row).
+        """
+        return self.page_store.query(sql, params)
+
+    def search(self, text:str) -> List[SuperDict]:
+        """
+        Full-text search on the markdown and the plain text 
+        of all pages.
+
+        Arguments:
+            text: the search terms, in FTS5 syntax 
+                (words, "a phrase", AND/OR/NOT, prefix*, etc.)
+
+        Returns:
+            The rows of matching pages (src_uri, title, snippet), 
+            best matches first.
+        """
+        return self.page_store.search(text)
+
+    # ----------------------------------
+    # Site-wide search
+    # ----------------------------------
+
+    def grep(self, pattern:str, in_:str=GREP_HTML,
+             workers:int=None) -> List[Tuple[MkDocsPage, str]]:
+        """
+        Search a text or regex pattern in all pages at once
+        (case-insensitive).
+
+        The files are memory-mapped and the search is split across
+        processes. If the pattern is a plain text, the pages where it 
+        does not appear are skipped without being parsed.
+        The lines are matched one by one (`^` and `$` anchor to a line).
+        If the test plugin kept a copy of the pages (option `output`), 
+        it is searched instead of the site directory.
+
+        Arguments:
+            pattern: the text or regex
+            in_: where to search: 'html' (the final HTML page, as raw text), 
+                'markdown' (the markdown after the plugins),
+                or 'text' (the plain text of the HTML page)
+            workers: the number of processes (default: number of CPUs)
+
+        Returns:
+            The (page, line) hits.
+
+        Example:
+            assert not project.grep('{{', in_='markdown'), "Unrendered macros"
+        """
+        pages = self.pages
+        if isinstance(pages, PageMap):
+            if in_ == GREP_MARKDOWN:
+                directory = os.path.join(self.test_dir, PAGES_DIRNAME)
+                files = {key: os.path.join(directory, entry['record'])
+                         for key, entry in pages.index.items()}
+            else:
+                # the copy of the page exported by the test plugin,
+                # if any (still there if the site directory was cleaned)
+                directory = os.path.join(self.test_dir, PAGES_DIRNAME)
+                files = {key: os.path.join(directory, entry['output'])
+                              if 'output' in entry else entry['dest_path']
+                         for key, entry in pages.index.items()}
+            hits = grep(files, pattern, in_=in_, workers=workers,
+                        parser=self.parser)
+        elif in_ == GREP_MARKDOWN:
+            # all pages in memory (page map)
+            regex = re.compile(pattern, re.IGNORECASE)
+            hits = [(key, line) for key, page in pages.items()
+                    for line in grep_lines(page.markdown, regex)]
+        else:
+            files = {key: page.file.abs_dest_path 
+                     for key, page in pages.items()}
+            hits = grep(files, pattern, in_=in_, workers=workers,
+                        parser=self.parser)
+        return [(pages[key], line) for key, line in hits]
+
+    @property
+    def page_lookup(self) -> PageLookup:
+        "The index of the names of the pages (built once per build)"
+        try:
+            return self._page_lookup
+        except AttributeError:
+            self._page_lookup = PageLookup(self.pages.keys())
+            return self._page_lookup
+
     def get_page(self, name:str) -> MkDocsPage:
         """
         Find a page with its name in the list of Markdown pages (filenames).
@@ -776,20 +1838,56 @@ class DocProject(object):
 
         Arguments:
             name: a page name (full or partial, with or without extension).
+
+        Raises:
+            AmbiguousPageError: if a partial name matches several pages
+        """
+        filename = self.page_lookup.find(name)
+        if filename is not None:
+            return self.pages[filename]
+
+    def get_pages(self, names:List[str]) -> List[MkDocsPage]:
+        """
+        Find several pages with their names (see get_page()).
+
+        Returns:
+            The pages, in the same order (None if not found).
+
+        Raises:
+            AmbiguousPageError: with all the partial names that match 
+                several pages
         """
-        # get all the filenames of pages:
-        filenames = [filename for filename in self.pages.keys()]
-        # get the filename we want, from that list:
-        filename = find_page(name, filenames)
-        # return the corresponding page:
-        return self.pages.get(filename)
+        filenames = self.page_lookup.find_many(names)
+        return [None if filename is None else self.pages[filename]
+                for filename in filenames]
         
     # ----------------------------------
     # Log
     # ----------------------------------
+    @property
+    def log_file(self) -> str:
+        "The log written by the test plugin, as JSON lines (option `json_log`)"
+        return os.path.join(self.test_dir, LOG_FILE)
+
+    @property
+    def trace_file(self) -> str:
+        "The file of the trace, when it is spooled (see build())"
+        return os.path.join(self.test_dir, TRACE_FILE)
+
+    @property
+    def is_spooled(self) -> bool:
+        "Was the trace of the build spooled to a file?"
+        return self.build_result.stderr is None
+
     @property
     def trace(self) -> str:
-        "Trace of the execution (the log) as text"
+        """
+        Trace of the execution (the log) as text
+        (read from the file, if it was spooled).
+        """
+        if self.is_spooled:
+            with open(self.trace_file, 'r', encoding='utf-8') as f:
+                return f.read()
         return self.build_result.stderr
     
    
@@ -798,26 +1896,51 @@ class DocProject(object):
     @property
     def log(self) -> List[LogEntry]:
         """
-        The parsed trace (LogEntry objects)
+        The parsed trace (LogEntry objects).
+
+        If the test plugin wrote the log as JSON lines (option `json_log`),
+        the entries are read from that file, with the name of the logger
+        and the page being processed (JsonLogEntry objects).
         """
         try:
             return self._log
         except AttributeError:
-            self._log = parse_log(self.trace)
+            if os.path.isfile(self.log_file):
+                self._log = read_json_log(self.log_file)
+            elif self.is_spooled:
+                self._log = read_spooled_log(self.trace_file)
+            else:
+                self._log = parse_log(self.trace)
             # print("BUILT:", self.log)
             return self._log
 
+    @property
+    def log_index(self) -> LogIndex:
+        "The index of the log, by severity and by source (built once)"
+        try:
+            return self._log_index
+        except AttributeError:
+            self._log_index = LogIndex(self.log)
+            return self._log_index
+
     @property
     def log_severities(self) -> List[str]:
         """
         List of severities (DEBUG, INFO, WARNING) found in the log
         """
-        try:
-            return self._log_severities
-        except AttributeError:
-            self._log_severities = list({entry.get('severity', '#None') 
-                                     for entry in self.log})
-            return self._log_severities
+        return list(self.log_index.by_severity)
+
+    def log_counts(self, by:str='severity') -> Dict[str, int]:
+        """
+        Count the entries of the log.
+
+        Arguments:
+            by: 'severity' or 'source'
+
+        Returns:
+            The number of entries for each severity (or source)
+        """
+        return self.log_index.counts(by)
 
 
     def find_entries(self, title:str='', source:str='',
@@ -833,39 +1956,8 @@ class DocProject(object):
         """
         if not title and not severity and not source:
             return self.log
-        
-        severity = severity.upper()
-        # if severity and severity not in self.log_severities:
-        #     raise ValueError(f"{severity} not in the list")
-        
-        filtered_entries = []
-        # Compile the title regex pattern once (if provided)
-        title_pattern = re.compile(title, re.IGNORECASE) if title else None
-        source_pattern = re.compile(source, re.IGNORECASE) if source else None
-        
-        for entry in self.log:
-            # Check if the entry matches the title regex (if provided)
-            if title_pattern:
-                title_match = re.search(title_pattern, entry.get('title', ''))
-            else:
-                title_match = True
-            # Check if the entry matches the source regex (if provided)
-            if source_pattern:
-                source_match = re.search(source_pattern, entry.get('source', ''))
-            else:
-                source_match = True
-
-            # Check if the entry matches the severity (if provided)
-            if severity:
-                severity_match = (entry['severity'] == severity)
-                # print("Decision:", severity_match)
-            else:
-                severity_match = True
-            # If both conditions are met, add the entry to the filtered list
-            if title_match and severity_match and source_match:
-                filtered_entries.append(entry)
-        assert isinstance(filtered_entries, list)
-        return filtered_entries
+        return [self.log[i] for i in self.log_index.find(title, source=source,
+                                                         severity=severity)]
 
 
     def find_entry(self, title:str='', 
@@ -880,14 +1972,28 @@ class DocProject(object):
             source: regex
             severity: the severity, e.g. DEBUG, INFO, WARNING
         """
-        found = self.find_entries(title, 
-                                  source=source,
-                                  severity=severity)
-        if len(found):
-            return found[0]
+        i = self.first_index_of(title, source=source, severity=severity)
+        if i is not None:
+            return self.log[i]
         else:
             return None          
 
+    def first_index_of(self, title:str='', 
+                       source:str = '',
+                       severity:str='') -> int:
+        """
+        Find the position in the log of the first entry
+        that matches the criteria (same as find_entry()).
+        Return None if not found.
+
+        Useful for checking the order of events, e.g.:
+
+            assert (project.first_index_of('Rendering', source='macros') <
+                    project.first_index_of('Copying static'))
+        """
+        return next(self.log_index.find(title, source=source, 
+                                        severity=severity), None)
+
     # ----------------------------------
     # Self-check
     # ----------------------------------
@@ -897,4 +2003,137 @@ class DocProject(object):
             name = page.file.name
             assert page.markdown, f"'{name}' is empty"
             assert page.is_src_file(), f"source (Markdown) of '{name}' is missing"
-            assert page.is_dest_file(), f"destination (HTML) of '{name}' is missing"
\ No newline at end of file
+            assert page.is_dest_file(), f"destination (HTML) of '{name}' is missing"
+
+
+
+# ---------------------------
+# Building several projects
+# ---------------------------
+
+@dataclass
+class BuildReport(object):
+    """
+    The result of the build of one project, by build_all()
+    """
+
+    project_dir: str
+    "The project directory"
+
+    returncode: int
+    "The return code of the build (None if it could not be run)"
+
+    duration: float
+    "The duration of the build (seconds)"
+
+    trace: str
+    "Trace of the execution (the log) as text"
+
+    error: str = None
+    "The exception raised by the build, if any (traceback)"
+
+    @property
+    def success(self) -> bool:
+        "Was the execution of the build a success?"
+        return self.returncode == 0
+
+    @property
+    def log(self) -> List[LogEntry]:
+        "The parsed trace"
+        return parse_log(self.trace or '')
+
+
+def _build_project(project:Union[str, DocProject], strict:bool, 
+                   verbose:bool, mode:str) -> BuildReport:
+    "Build one project (in a worker thread)"
+    project_dir = (project.project_dir if isinstance(project, DocProject)
+                   else project)
+    start = time.perf_counter()
+    try:
+        if not isinstance(project, DocProject):
+            project = DocProject(path=project_dir)
+        result = project.build(strict=strict, verbose=verbose, mode=mode)
+    except Exception:
+        # (the other builds go on)
+        return BuildReport(project_dir, None, time.perf_counter() - start,
+                           '', error=traceback.format_exc())
+    return BuildReport(project_dir, result.returncode,
+                       time.perf_counter() - start, result.stderr)
+
+
+def build_all(projects:List[Union[str, DocProject]], workers:int=None,
+              path:str='', strict:bool=False, verbose:bool=False,
+              mode:str=SUBPROCESS_MODE) -> List[BuildReport]:
+    """
+    Build several MkDocs projects at once: each build is a separate
+    process (`mkdocs build`), launched from a pool of threads.
+
+    The builds that took longest at the previous run
+    (or that never ran) are started first.
+
+    Arguments:
+        projects: the projects, as DocProject objects or directories 
+            (e.g. the result of `list_doc_projects()`)
+        workers: the number of builds run at the same time
+            (default: number of CPUs)
+        path: the reference directory for relative project directories
+            (default: directory of the calling program)
+        strict: to make the builds fail in case of warnings
+        verbose: to log DEBUG entries
+        mode: 'subprocess' (default) or 'stream'; the other modes
+            would run the builds within the current interpreter, 
+            where they would share their state.
+
+    Returns:
+        The build reports (success, duration, log, error), in the order
+        of the projects. A project given twice is built once 
+        (it appears twice, with the same report). An exception raised 
+        by a build is recorded in the report of its project 
+        (`error`), without stopping the others.
+
+    Note:
+        A DocProject object given as argument is built as such:
+        its pages and log are then those of the new build. 
+        For a directory, the pages are not loaded; to test them, 
+        declare a DocProject object for the project directory
+        (no need to build it again).
+    """
+    if mode not in (SUBPROCESS_MODE, STREAM_MODE):
+        raise ValueError(f"Cannot build several projects in '{mode}' mode "
+                         f"(must be '{SUBPROCESS_MODE}' or '{STREAM_MODE}')")
+    if not path:
+        # get the caller's directory
+        caller_frame = inspect.stack()[1]
+        path = os.path.abspath(os.path.dirname(caller_frame.filename))
+    project_dirs = []
+    doc_projects = {}
+    for project in projects:
+        if isinstance(project, DocProject):
+            project_dir = os.path.normpath(project.project_dir)
+            doc_projects.setdefault(project_dir, project)
+        else:
+            project_dir = os.path.normpath(os.path.join(path, project))
+        project_dirs.append(project_dir)
+
+    def expected_duration(project_dir:str) -> float:
+        "Duration of the previous build (infinite if unknown)"
+        info_file = os.path.join(project_dir, TEST_DIRNAME, BUILD_INFO)
+        try:
+            with open(info_file, 'r') as f:
+                return json.load(f)['duration']
+        except (FileNotFoundError, ValueError, KeyError):
+            return float('inf')
+
+    # each project once
+    schedule = sorted(dict.fromkeys(project_dirs), key=expected_duration, 
+                      reverse=True)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1
+                            ) as executor:
+        futures = {project_dir: executor.submit(_build_project, 
+                                    doc_projects.get(project_dir, project_dir),
+                                    strict, verbose, mode)
+                   for project_dir in schedule}
+        reports = {project_dir: future.result() 
+                   for project_dir, future in futures.items()}
+    # restore the original order
+    return [reports[project_dir] for project_dir in project_dirs]
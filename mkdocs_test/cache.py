@@ -0,0 +1,373 @@
+"""
+Content-addressed build cache.
+
+If the sources of a project (docs directory, config file, hooks)
+and the versions of mkdocs, the plugins and the themes have not changed,
+the result of a previous build (site directory and test directory)
+is restored, instead of running MkDocs again.
+
+The source files of the distributions installed from a local
+directory (e.g. a plugin under development, in editable mode)
+are hashed as well, since their version does not change with their code.
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from typing import List, Dict
+
+from .common import TEST_DIRNAME, BUILD_INFO
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"Default maximum size of the cache (bytes)"
+CACHE_MAX_SIZE = 1024 ** 3
+
+"The file describing a cache entry"
+CACHE_ENTRY_FILE = 'result.json'
+
+"The entry points that are relevant for a build (plugins, themes, etc.)"
+ENTRY_POINT_GROUPS = ['mkdocs.plugins', 'mkdocs.themes', 'markdown.extensions']
+
+"The distributions that are always relevant for a build"
+CORE_DISTRIBUTIONS = ['mkdocs', 'markdown', 'jinja2', 'mkdocs-test']
+
+"The directories where distributions are normally installed"
+PACKAGE_DIRS = ['site-packages', 'dist-packages']
+
+"The extensions of the source files of a distribution"
+SOURCE_EXTENSIONS = ('.py', '.html', '.j2', '.jinja', '.jinja2', '.js', '.css',
+                     '.yml', '.yaml', '.json')
+
+"The directories that are not part of the sources of a distribution"
+IGNORED_DIRS = {'__pycache__', 'node_modules', 'build', 'dist', 'site',
+                'test', 'tests', TEST_DIRNAME}
+
+
+def default_cache_dir() -> str:
+    "The default directory of the cache (can be set by MKDOCS_TEST_CACHE)"
+    directory = os.environ.get('MKDOCS_TEST_CACHE')
+    if not directory:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        directory = os.path.join(base, 'mkdocs-test')
+    return directory
+
+
+def dir_size(directory:str) -> int:
+    "Total size of the files in a directory (bytes)"
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, dirs, files in os.walk(directory)
+               for name in files)
+
+
+def relevant_distributions() -> list:
+    """
+    The installed distributions that are relevant for a build:
+    mkdocs, etc. and those that provide plugins, themes 
+    or markdown extensions
+    """
+    from importlib.metadata import distributions
+    relevant = []
+    for dist in distributions():
+        name = dist.metadata['Name'] or ''
+        groups = {entry_point.group for entry_point in dist.entry_points}
+        if (name.lower() in CORE_DISTRIBUTIONS or
+                groups.intersection(ENTRY_POINT_GROUPS)):
+            relevant.append(dist)
+    return relevant
+
+
+def source_paths(dist) -> List[str]:
+    """
+    The paths of the sources of a distribution installed from a local
+    directory (editable, or `pip install <path>`): its top-level packages
+    and modules; empty if it was installed from an index.
+    """
+    root = None
+    direct_url = dist.read_text('direct_url.json')
+    if direct_url:
+        info = json.loads(direct_url)
+        if 'dir_info' not in info or not info['url'].startswith('file:'):
+            return []
+        if not info['dir_info'].get('editable'):
+            # a copy of the sources was installed
+            return sorted({os.path.abspath(str(dist.locate_file(file)))
+                           for file in dist.files or []
+                           if str(file).endswith(SOURCE_EXTENSIONS)})
+        root = url2pathname(urlparse(info['url']).path)
+    else:
+        # e.g. `setup.py develop`: the metadata are in the sources
+        root = os.path.abspath(str(dist.locate_file('')))
+        if set(root.split(os.sep)).intersection(PACKAGE_DIRS):
+            return []
+    top_level = (dist.read_text('top_level.txt') or '').split()
+    paths = [path for name in top_level if name not in IGNORED_DIRS
+             for path in (os.path.join(root, name), 
+                          os.path.join(root, name + '.py'))
+             if os.path.exists(path)]
+    return paths or [root]
+
+
+def list_files(paths:List[str], extensions:tuple=None) -> List[str]:
+    """
+    The files of a list of paths (files or directories, walked
+    recursively, without the hidden and ignored directories), sorted;
+    only those with the extensions given, if any.
+    """
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [name for name in dirs 
+                       if not name.startswith('.') and name not in IGNORED_DIRS]
+            files.extend(os.path.join(root, name) for name in names
+                         if extensions is None or name.endswith(extensions))
+    return sorted(set(files))
+
+
+_versions = None
+_local_sources = None
+
+def installed_versions() -> List[str]:
+    """
+    The versions of mkdocs and of the installed distributions
+    that provide plugins, themes or markdown extensions
+    (computed once per session).
+    """
+    global _versions
+    if _versions is None:
+        _versions = sorted({f"{(dist.metadata['Name'] or '').lower()}=={dist.version}"
+                            for dist in relevant_distributions()})
+    return _versions
+
+
+def local_sources() -> Dict[str, List[str]]:
+    """
+    The relevant distributions that are installed from a local directory
+    (name -> paths of the sources), e.g. a plugin under development
+    (the list is computed once per session; not the files).
+    """
+    global _local_sources
+    if _local_sources is None:
+        _local_sources = {}
+        for dist in relevant_distributions():
+            paths = source_paths(dist)
+            if paths:
+                _local_sources[(dist.metadata['Name'] or '').lower()] = paths
+    return _local_sources
+
+
+# ---------------------------
+# Cache key
+# ---------------------------
+
+def project_sources(project_dir:str, config_file:str, config:dict) -> List[str]:
+    """
+    The source files of a project that determine the build
+    (full paths, sorted): config file, docs directory, hooks
+    and custom directory of the theme.
+    """
+    config_file = os.path.join(project_dir, config_file)
+    sources = [config_file]
+    config_dir = os.path.dirname(config_file)
+    directories = [config.get('docs_dir', 'docs')]
+    theme = config.get('theme')
+    if isinstance(theme, dict) and theme.get('custom_dir'):
+        directories.append(theme['custom_dir'])
+    for directory in directories:
+        directory = os.path.join(config_dir, directory)
+        for root, dirs, files in os.walk(directory):
+            sources.extend(os.path.join(root, name) for name in files)
+    for hook in config.get('hooks') or []:
+        sources.append(os.path.join(config_dir, hook))
+    return sorted(set(sources))
+
+
+def cache_key(project_dir:str, config_file:str, config:dict, 
+              extra_paths:List[str]=None, **options) -> str:
+    """
+    The key of a build in the cache: hash of the source files
+    (names and contents), of the versions of the installed
+    distributions (and of the sources of those installed from
+    a local directory) and of the build options.
+
+    Arguments:
+        project_dir: the project directory
+        config_file: the config file (relative to the project dir)
+        config: the content of the config file
+        extra_paths: other files or directories read by the build
+            (relative to the project dir), e.g. by a plugin
+        options: the build options (strict, etc.)
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([installed_versions(), sorted(options.items())]).encode())
+
+    def add_file(filename:str, name:str):
+        "Add the name and the contents of a file"
+        h.update(name.encode() + b'\0')
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+
+    for filename in project_sources(project_dir, config_file, config):
+        add_file(filename, os.path.relpath(filename, project_dir))
+    extra_paths = [os.path.join(project_dir, path) for path in extra_paths or []]
+    # (a missing path is hashed by its name)
+    for filename in sorted(set(list_files(extra_paths)).union(
+                        path for path in extra_paths if not os.path.exists(path))):
+        add_file(filename, os.path.relpath(filename, project_dir))
+    for name, paths in sorted(local_sources().items()):
+        for filename in list_files(paths, SOURCE_EXTENSIONS):
+            add_file(filename, f"{name}:{filename}")
+    return h.hexdigest()
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+
+class BuildCache(object):
+    """
+    A cache of builds, with a size-bounded LRU eviction policy.
+
+    Each entry contains the result of the build,
+    the site directory and the test directory.
+    """
+
+    def __init__(self, directory:str=None, max_size:int=CACHE_MAX_SIZE):
+        """
+        Arguments:
+            directory: the directory of the cache (default: see default_cache_dir())
+            max_size: the maximum size of the cache (bytes);
+                the least recently used entries are evicted beyond that.
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def entry_dir(self, key:str) -> str:
+        "The directory of an entry"
+        return os.path.join(self.directory, key)
+
+    def get(self, key:str, project_dir:str, site_dir:str) -> Dict:
+        """
+        Restore an entry into the project (site dir and test dir).
+
+        Returns:
+            The stored result (or None, if not found)
+        """
+        entry_file = os.path.join(self.entry_dir(key), CACHE_ENTRY_FILE)
+        try:
+            with open(entry_file, 'r') as f:
+                result = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self._restore(os.path.join(self.entry_dir(key), 'site'),
+                      os.path.join(project_dir, site_dir))
+        self._restore(os.path.join(self.entry_dir(key), 'test'),
+                      os.path.join(project_dir, TEST_DIRNAME))
+        # mark as recently used
+        os.utime(entry_file)
+        self.hits += 1
+        return result
+
+    def put(self, key:str, project_dir:str, site_dir:str, result:dict):
+        "Store the result of a build (with the site dir and test dir)"
+        entry_dir = self.entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for src, dest in ((site_dir, 'site'), (TEST_DIRNAME, 'test')):
+            src = os.path.join(project_dir, src)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(tmp_dir, dest),
+                                ignore=shutil.ignore_patterns(BUILD_INFO))
+        result = {**result, 'size': dir_size(tmp_dir)}
+        with open(os.path.join(tmp_dir, CACHE_ENTRY_FILE), 'w') as f:
+            json.dump(result, f)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.evict()
+
+    @staticmethod
+    def _restore(src:str, dest:str):
+        "Replace the content of a directory by the cached copy"
+        if os.path.isdir(dest):
+            # keep the information on the builds
+            for name in os.listdir(dest):
+                if name == BUILD_INFO:
+                    continue
+                path = os.path.join(dest, name)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+        if os.path.isdir(src):
+            shutil.copytree(src, dest, dirs_exist_ok=True)
+
+    def entries(self) -> List[Dict]:
+        "The entries of the cache (key, size, last use), most recent first"
+        entries = []
+        if os.path.isdir(self.directory):
+            for key in os.listdir(self.directory):
+                entry_file = os.path.join(self.entry_dir(key), CACHE_ENTRY_FILE)
+                try:
+                    with open(entry_file, 'r') as f:
+                        size = json.load(f).get('size', 0)
+                    last_used = os.path.getmtime(entry_file)
+                except (FileNotFoundError, ValueError, NotADirectoryError):
+                    continue
+                entries.append({'key': key, 'size': size, 'last_used': last_used})
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries,
+        until the cache is under its maximum size.
+
+        Returns:
+            Number of entries removed.
+        """
+        total = 0
+        removed = 0
+        for entry in self.entries():
+            total += entry['size']
+            if total > self.max_size:
+                shutil.rmtree(self.entry_dir(entry['key']), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def clear(self):
+        "Remove all entries"
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @property
+    def stats(self) -> Dict:
+        "Statistics of the cache: hits and misses (this session), entries and size"
+        entries = self.entries()
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(entries),
+                'size': sum(entry['size'] for entry in entries)}
+
+
+_cache = None
+
+def get_build_cache() -> BuildCache:
+    "Get the default build cache"
+    global _cache
+    if _cache is None:
+        _cache = BuildCache()
+    return _cache
@@ -14,11 +14,15 @@ from io import StringIO
 import inspect
 import subprocess
 import yaml
+from dataclasses import dataclass
+from functools import lru_cache
+from contextlib import contextmanager
 from typing import List, Dict, Tuple
 
 import markdown
 import pandas as pd
 from bs4 import BeautifulSoup
+from bs4.element import Tag
 
 from super_collections import SuperDict
 
@@ -38,6 +42,45 @@ DOCS_DEFAULT_DIRNAME = 'docs'
 "The mapping file (communication between plugin and test)"
 PAGE_MAP = 'page_map.json'
 
+"The index of the pages exported one by one (src_uri -> record file)"
+PAGE_INDEX = 'page_index.json'
+
+"The directory of the pages exported one by one"
+PAGES_DIRNAME = 'pages'
+
+"The SQLite database of the pages (optional)"
+PAGE_DB = 'pages.db'
+
+"The information on the last build (duration, etc.)"
+BUILD_INFO = 'build_info.json'
+
+"The trace of the build, when it is spooled to a file"
+TRACE_FILE = 'trace.log'
+
+"The log of the build, as JSON lines (one per log record)"
+LOG_FILE = 'log.jsonl'
+
+"The timings of the event handlers of the plugins (per plugin and event)"
+TIMINGS_FILE = 'timings.json'
+
+"The timeline of the build (Chrome trace-event format)"
+TIMELINE_FILE = 'timeline.json'
+
+"The environment variable that makes the test plugin record the timeline"
+TIMELINE_ENV = 'MKDOCS_TEST_TIMELINE'
+
+"The profile of the templates (render and load times)"
+TEMPLATES_FILE = 'templates.json'
+
+"The directory of the bytecode cache of the templates (Jinja2)"
+JINJA_CACHE_DIRNAME = 'jinja_cache'
+
+"The profile of the markdown conversion (time per processor and page)"
+MARKDOWN_PROFILE_FILE = 'markdown_profile.json'
+
+"The stats of cProfile, for the whole build"
+PROFILE_FILE = 'build.pstats'
+
 # ---------------------------
 # Print functions
 # ---------------------------
@@ -69,10 +112,12 @@ def h3(s:str, color:str=TITLE_COLOR):
 
 
 
+"ANSI color instructions"
+ANSI_ESCAPE = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+
 def strip_ansi_colors(text):
     "Strip ANSI color instructions"
-    ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
-    return ansi_escape.sub('', text)
+    return ANSI_ESCAPE.sub('', text)
 
 
 
@@ -118,6 +163,88 @@ def find_page(name:str, filenames:List) -> str:
         if stem.endswith(name):
             return filename
 
+class AmbiguousPageError(LookupError):
+    "A partial name matches several pages"
+
+    def __init__(self, candidates:Dict[str, List[str]]):
+        """
+        Arguments:
+            candidates: for each ambiguous name, the pages that match it
+        """
+        self.candidates = candidates
+        names = '; '.join(f"'{name}' -> {filenames}"
+                          for name, filenames in candidates.items())
+        super().__init__(f"Ambiguous page name(s): {names}")
+
+
+class PageLookup(object):
+    """
+    Index of the names of the pages (src_uri), to find a page
+    with a name (full or partial, with or without extension).
+    It is built once, for a list of pages.
+
+    Same rules as find_page(): exact matches (full name or name 
+    without extension) have priority over partial matches 
+    (end of the path); but a partial match must be unique.
+    """
+
+    def __init__(self, filenames:List[str]):
+        self._filenames = list(filenames)
+        self._exact = {}
+        self._suffixes = {}
+        for filename in self._filenames:
+            stem, _ = os.path.splitext(filename)
+            self._exact.setdefault(filename, filename)
+            self._exact.setdefault(stem, filename)
+            # path suffixes (one or more directories removed)
+            parts = filename.split('/')
+            for i in range(1, len(parts)):
+                suffix = '/'.join(parts[i:])
+                for key in {suffix, os.path.splitext(suffix)[0]}:
+                    self._suffixes.setdefault(key, []).append(filename)
+
+    def find_all(self, name:str) -> List[str]:
+        "All the pages that match a name (best matches only)"
+        try:
+            return [self._exact[name]]
+        except KeyError:
+            pass
+        try:
+            return self._suffixes[name]
+        except KeyError:
+            pass
+        # any end of the name (rare)
+        return [filename for filename in self._filenames
+                if filename.endswith(name) or 
+                   os.path.splitext(filename)[0].endswith(name)]
+
+    def find(self, name:str) -> str:
+        """
+        Find the page that matches a name (None if not found).
+        Raise an AmbiguousPageError if several pages match.
+        """
+        filenames = self.find_all(name)
+        if len(filenames) > 1:
+            raise AmbiguousPageError({name: filenames})
+        return filenames[0] if filenames else None
+
+    def find_many(self, names:List[str]) -> List[str]:
+        """
+        Find the pages that match a list of names (None if not found).
+        Raise an AmbiguousPageError, with all the names that are ambiguous.
+        """
+        found = []
+        ambiguous = {}
+        for name in names:
+            filenames = self.find_all(name)
+            if len(filenames) > 1:
+                ambiguous[name] = filenames
+            found.append(filenames[0] if filenames else None)
+        if ambiguous:
+            raise AmbiguousPageError(ambiguous)
+        return found
+
+
 def list_markdown_files(directory:str):
     """
     Makes a list of markdown files in a directory
@@ -159,16 +286,72 @@ def style_dataframe(df:pd.DataFrame):
     df.__rich__ = _rich_str.__get__(df)
 
 
+# --------------------------------------------
+# HTML parsers
+# --------------------------------------------
+
+"The HTML parsers that can be used by BeautifulSoup (backends)"
+PYTHON_PARSER = 'html.parser'
+LXML_PARSER = 'lxml'
+HTML5LIB_PARSER = 'html5lib'
+HTML_PARSERS = [PYTHON_PARSER, LXML_PARSER, HTML5LIB_PARSER]
+
+_html_parser = PYTHON_PARSER
+
+
+def check_html_parser(parser: str) -> str:
+    """
+    Check that an HTML parser is known and installed
+    (ValueError if not).
+    """
+    from bs4.builder import builder_registry
+    if parser not in HTML_PARSERS:
+        raise ValueError(f"Unknown HTML parser '{parser}' "
+                         f"(must be one of {HTML_PARSERS})")
+    if builder_registry.lookup(parser) is None:
+        raise ValueError(f"HTML parser '{parser}' is not installed")
+    return parser
+
+
+def set_html_parser(parser: str):
+    """
+    Set the HTML parser used by default, for all projects
+    (`html.parser`, `lxml` or `html5lib`).
+
+    `lxml` is the fastest; `html5lib` is the slowest,
+    but it parses the pages exactly as a browser would.
+    """
+    global _html_parser
+    _html_parser = check_html_parser(parser)
+
+
+def get_html_parser() -> str:
+    "Get the HTML parser used by default"
+    return _html_parser
+
+
+def parse_html(html: str, parser: str = None) -> BeautifulSoup:
+    """
+    Parse an HTML document with BeautifulSoup.
+
+    Arguments:
+        html: the HTML source
+        parser: the HTML parser (default: see set_html_parser())
+    """
+    return BeautifulSoup(html, parser or _html_parser)
+
+
 # --------------------------------------------
 # Smart find/extraction functions (HTML)
 # --------------------------------------------
 
 
-def extract_tables_from_html(html:str, formatter:callable=None):
+def extract_tables_from_html(html:str, formatter:callable=None,
+                             parser:str=None):
     """
     Extract tables from an HTML source and convert them into dataframes
     """
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = parse_html(html, parser)
     tables = soup.find_all('table')
     
     dataframes = {}
@@ -193,9 +376,94 @@ def extract_tables_from_html(html:str, formatter:callable=None):
     return dataframes
 
 
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str, flags: int = re.IGNORECASE) -> re.Pattern:
+    "Compile a regex pattern (cached)"
+    return re.compile(pattern, flags)
+
+
+def find_line(text: str, regex: re.Pattern) -> str:
+    "Find the first line of a text that matches a compiled regex, or None"
+    if regex.search(text):
+        for line in text.split('\n'):
+            if regex.search(line):
+                return line
+    return None
+
+
+"The tags of the headers"
+HEADER_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+@dataclass
+class Section(object):
+    """
+    A section of an HTML document: a header and the text 
+    that follows it, until the next header (any level).
+    """
+
+    level: int
+    "Level of the header (1 to 6)"
+
+    id: str
+    "Id of the header (None if not available)"
+
+    title: str
+    "Text of the header"
+
+    text: str
+    "Text of the section (one line per element)"
+
+
+def get_sections(soup: BeautifulSoup) -> List[Section]:
+    """
+    Make the index of the sections of a parsed HTML document
+    (the text between each header and the next one).
+    """
+    sections = []
+    for hdr in soup.find_all(HEADER_TAGS):
+        # Extract text until the next header
+        text = []
+        for sibling in hdr.next_siblings:
+            if not isinstance(sibling, Tag):
+                continue
+            if sibling.name in HEADER_TAGS:
+                break
+            text.append(sibling.get_text(separator='\n', strip=True))
+        sections.append(Section(level=int(hdr.name[1]), id=hdr.get('id'),
+                                title=hdr.text, text='\n'.join(text)))
+    return sections
+
+
+def find_in_sections(sections: List[Section], full_text: str,
+                     pattern: str, 
+                     header: str = None, header_level: int = None) -> str:
+    """
+    Find a text or regex pattern (case-insensitive) in the sections
+    of an HTML document, or in its full text.
+    See find_in_html() for the arguments.
+    """
+    if not isinstance(pattern, str):
+        pattern = str(pattern)
+    pattern_regex = compile_pattern(pattern)
+    if header:
+        header_regex = compile_pattern(header)
+        for section in sections:
+            if header_regex.search(section.title):
+                # Check if header level is specified and matches
+                if header_level and section.level != int(header_level):
+                    continue
+                line = find_line(section.text, pattern_regex)
+                if line is not None:
+                    return line
+        return None
+    else:
+        return find_line(full_text, pattern_regex)
+
+
 def find_in_html(html: str, 
                  pattern: str, 
-                 header: str = None, header_level: int = None) -> str:
+                 header: str = None, header_level: int = None,
+                 parser: str = None) -> str:
     """
     Find a text or regex pattern in a HTML document (case-insensitive)
     
@@ -207,62 +475,19 @@ def find_in_html(html: str,
     and then looks for the text between that header and the next one
     (any level).
     - header_level: you can speciy it, if there is a risk of ambiguity.
+    - parser: the HTML parser (default: see set_html_parser()).
 
     Returns
     -------
     The line where the pattern was found, or None
     """
-    if not isinstance(pattern, str):
-        pattern = str(pattern)
-
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    # Compile regex patterns with case-insensitive flag
-    pattern_regex = re.compile(pattern, re.IGNORECASE)
-    
+    soup = parse_html(html, parser)
     if header:
-        header_regex = re.compile(header, re.IGNORECASE)
-        
-        # Find all headers (h1 to h6)
-        headers = soup.find_all(re.compile('^h[1-6]$', re.IGNORECASE))
-        
-        for hdr in headers:
-            if header_regex.search(hdr.text):
-                # Check if header level is specified and matches
-                if header_level and hdr.name != f'h{header_level}':
-                    continue
-                
-                # Extract text until the next header
-                text = []
-                for sibling in hdr.find_next_siblings():
-                    if sibling.name and re.match('^h[1-6]$', sibling.name, re.IGNORECASE):
-                        break
-                    text.append(sibling.get_text(separator='\n', strip=True))
-                
-                full_text = '\n'.join(text)
-                
-                # Search for the pattern in the extracted text
-                match = pattern_regex.search(full_text)
-                if match:
-                    # Find the full line containing the match
-                    lines = full_text.split('\n')
-                    for line in lines:
-                        if pattern_regex.search(line):
-                            return line
+        return find_in_sections(get_sections(soup), '', pattern,
+                                header=header, header_level=header_level)
     else:
-        # Extract all text from the document
         full_text = soup.get_text(separator='\n', strip=True)
-        
-        # Search for the pattern in the full text
-        match = pattern_regex.search(full_text)
-        if match:
-            # Find the full line containing the match
-            lines = full_text.split('\n')
-            for line in lines:
-                if pattern_regex.search(line):
-                    return line
-    
-    return None
+        return find_in_sections([], full_text, pattern)
 
 
 
@@ -322,6 +547,49 @@ def get_first_h1(markdown_text: str):
     return None
 
 
+"A header in markdown (# syntax)"
+ATX_HEADER = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]|$)')
+
+"An underline of a header in markdown (=== or --- syntax)"
+SETEXT_UNDERLINE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+
+"A fence of a code block in markdown"
+CODE_FENCE = re.compile(r'^ {0,3}(```|~~~)')
+
+
+def get_headers(markdown_text: str) -> List[Tuple[int, int]]:
+    """
+    Get the headers of a markdown text (both syntaxes),
+    ignoring the code blocks.
+
+    Returns:
+        The (line number, level) of each header, in order
+        (line numbers start at 1).
+    """
+    headers = []
+    in_code = False
+    previous = ''
+    for lineno, line in enumerate(markdown_text.splitlines(), start=1):
+        if CODE_FENCE.match(line):
+            in_code = not in_code
+            previous = ''
+            continue
+        if in_code:
+            continue
+        match = ATX_HEADER.match(line)
+        if match:
+            headers.append((lineno, len(match.group(1))))
+            line = ''
+        else:
+            match = SETEXT_UNDERLINE.match(line)
+            if match and previous.strip():
+                level = 1 if match.group(1).startswith('=') else 2
+                headers.append((lineno - 1, level))
+                line = ''
+        previous = line
+    return headers
+
+
 
 def get_tables(markdown_text:str) -> Dict[str, pd.DataFrame]:
     """
@@ -343,6 +611,27 @@ def run_command(command, *args) -> subprocess.CompletedProcess:
     full_command = [command] + list(args)
     return subprocess.run(full_command, capture_output=True, text=True)
 
+@contextmanager
+def environ(variables:Dict[str, str]):
+    """
+    Set environment variables, within a context (restored at the end);
+    a variable whose value is None is unset.
+    """
+    old_values = {name: os.environ.get(name) for name in variables}
+    set_environ(variables)
+    try:
+        yield
+    finally:
+        set_environ(old_values)
+
+def set_environ(variables:Dict[str, str]):
+    "Set environment variables (unset those whose value is None)"
+    for name, value in variables.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
 def get_caller_directory():
     "Get the caller's directory name (to be called from a function)"
     # Get the current frame
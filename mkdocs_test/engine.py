@@ -0,0 +1,367 @@
+"""
+Build engines: the different ways of running `mkdocs build`
+for a documentation project.
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+import sys
+import cProfile
+import logging
+import threading
+import traceback
+import subprocess
+from typing import List, Tuple, Dict, Callable
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"Command for build"
+MKDOCS_BUILD = ['mkdocs', 'build']
+
+"The build modes available"
+SUBPROCESS_MODE = 'subprocess'
+INPROCESS_MODE = 'inprocess'
+FORK_MODE = 'fork'
+STREAM_MODE = 'stream'
+BUILD_MODES = [SUBPROCESS_MODE, INPROCESS_MODE, FORK_MODE, STREAM_MODE]
+
+"""
+Script that runs `mkdocs build` under cProfile (arguments: the stats file,
+then those of mkdocs); unlike `python -m cProfile`, it keeps the exit code.
+"""
+PROFILE_SCRIPT = """
+import sys, cProfile
+from mkdocs.__main__ import cli
+profiler = cProfile.Profile()
+try:
+    profiler.runcall(cli, sys.argv[2:], prog_name='mkdocs')
+finally:
+    profiler.dump_stats(sys.argv[1])
+"""
+
+
+def build_command(strict:bool=False, verbose:bool=False,
+                  dirty:bool=False) -> List[str]:
+    "Make the `mkdocs build` command (as list)"
+    command = MKDOCS_BUILD.copy()
+    if strict:
+        command.append('--strict')
+    if verbose:
+        command.append('--verbose')
+    if dirty:
+        command.append('--dirty')
+    return command
+
+
+def profile_command(command:List[str], profile:str) -> List[str]:
+    "Make a build command run under cProfile, with the stats written to a file"
+    os.makedirs(os.path.dirname(os.path.abspath(profile)), exist_ok=True)
+    return [sys.executable, '-c', PROFILE_SCRIPT, profile] + command[1:]
+
+
+class BuildResult(subprocess.CompletedProcess):
+    """
+    The result of a build (as a completed process), with the
+    resource usage of the build process: user and system CPU time 
+    (seconds) and peak memory (bytes), or None if not available.
+    """
+
+    def __init__(self, args, returncode:int, stdout:str=None, stderr:str=None,
+                 usage:Dict[str, float]=None):
+        super().__init__(args, returncode, stdout=stdout, stderr=stderr)
+        self.usage = usage
+
+
+def make_usage(rusage, before=None) -> Dict[str, float]:
+    """
+    Make the resource usage of a process (user_cpu, sys_cpu, max_rss),
+    from the result of getrusage() or wait4(); CPU times are
+    counted since `before`, if given.
+    """
+    # on macOS, the peak memory is in bytes, otherwise in kilobytes
+    factor = 1 if sys.platform == 'darwin' else 1024
+    usage = {'user_cpu': rusage.ru_utime, 'sys_cpu': rusage.ru_stime,
+             'max_rss': rusage.ru_maxrss * factor}
+    if before is not None:
+        usage['user_cpu'] -= before.ru_utime
+        usage['sys_cpu'] -= before.ru_stime
+    return usage
+
+
+def wait_process(process:subprocess.Popen) -> Dict[str, float]:
+    """
+    Wait for a child process to finish (as Popen.wait()),
+    and get its resource usage (None, if not available on this platform).
+    """
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        return None
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # already reaped
+        process.wait()
+        return None
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return make_usage(rusage)
+
+
+def read_in_background(stream) -> Tuple[threading.Thread, List[str]]:
+    "Read a stream in the background (so that the pipe never fills up)"
+    chunks = []
+    thread = threading.Thread(target=lambda: chunks.append(stream.read()),
+                              daemon=True)
+    thread.start()
+    return thread, chunks
+
+
+def format_record(severity:str, message:str) -> str:
+    """
+    Format a log record in the same way as the MkDocs command line
+    (without colors and without wrapping).
+    """
+    return f'{severity:<8}-  {message}'
+
+
+# ---------------------------
+# Capture of the log
+# ---------------------------
+
+class LogCapture(logging.Handler):
+    """
+    Logging handler that keeps the records of the mkdocs logger
+    hierarchy, as (severity, message) pairs.
+    """
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                exc_text = ''.join(traceback.format_exception(*record.exc_info))
+                message = f"{message}\n{exc_text.rstrip()}"
+            self.records.append((record.levelname, message))
+        except Exception:
+            self.handleError(record)
+
+    @property
+    def trace(self) -> str:
+        "The log, as it would have been printed by the command line"
+        return '\n'.join(format_record(severity, message)
+                         for severity, message in self.records)
+
+
+# ---------------------------
+# Engines
+# ---------------------------
+
+def run_subprocess(strict:bool=False, verbose:bool=False,
+                   dirty:bool=False, spool:str=None, 
+                   profile:str=None, cwd:str=None) -> BuildResult:
+    """
+    Run `mkdocs build` in a separate process (in the current directory,
+    or in the directory given, which is safe from several threads).
+
+    If a spool file is given, the log (stderr) is written into it,
+    instead of being kept in memory (the stderr of the result is then None).
+
+    If a profile file is given, the build is run under cProfile
+    and the stats are written into that file.
+    """
+    command = build_command(strict=strict, verbose=verbose, dirty=dirty)
+    if profile:
+        command = profile_command(command, profile)
+    print("BUILD COMMAND:", command)
+    if spool is None:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True, cwd=cwd)
+        reader, stdout = read_in_background(process.stdout)
+        stderr = process.stderr.read()
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(spool)), exist_ok=True)
+        with open(spool, 'wb') as f:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                       stderr=f, text=True, cwd=cwd)
+        reader, stdout = read_in_background(process.stdout)
+        stderr = None
+    reader.join()
+    usage = wait_process(process)
+    return BuildResult(command, process.returncode, stdout=''.join(stdout),
+                       stderr=stderr, usage=usage)
+
+
+def run_stream(strict:bool=False, verbose:bool=False, dirty:bool=False,
+               on_line:Callable[[str], bool]=None, spool:str=None,
+               profile:str=None, cwd:str=None) -> Tuple[BuildResult, bool]:
+    """
+    Run `mkdocs build` in a separate process (in the current directory,
+    or in the directory given), reading its log (stderr) line by line, 
+    as it is written.
+
+    Arguments:
+        strict, verbose, dirty: see run_inprocess()
+        on_line: function called for each line of the log (without the
+            end of line); if it returns True, the build is stopped
+            (the process is killed).
+        spool: a file where the log is written, instead of being kept
+            in memory (the stderr of the result is then None)
+        profile: a file where the stats of cProfile are written
+            (the build is then run under cProfile; if the build is stopped,
+            there are no stats)
+
+    Returns:
+        - the low level result (as if it had been run as a command),
+          where the stderr contains the log read so far
+        - whether the build was stopped
+    """
+    command = build_command(strict=strict, verbose=verbose, dirty=dirty)
+    if profile:
+        command = profile_command(command, profile)
+    print("BUILD (streaming):", command)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, bufsize=1,
+                               cwd=cwd)
+    reader, stdout = read_in_background(process.stdout)
+    lines = []
+    stopped = False
+    if spool is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(spool)), exist_ok=True)
+        spool_file = open(spool, 'w', encoding='utf-8')
+    try:
+        for line in process.stderr:
+            if spool is None:
+                lines.append(line)
+            else:
+                spool_file.write(line)
+            if on_line and on_line(line.rstrip('\n')):
+                stopped = True
+                process.kill()
+                break
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stderr.close()
+        reader.join()
+        usage = wait_process(process)
+        if spool is not None:
+            spool_file.close()
+    if stopped:
+        print("BUILD STOPPED")
+    result = BuildResult(command, process.returncode,
+                         stdout=''.join(stdout),
+                         stderr=None if spool else ''.join(lines),
+                         usage=usage)
+    return result, stopped
+
+
+"The number of in-process builds run in this process (see the build server)"
+inprocess_builds = 0
+
+def run_inprocess(config_file:str=None, strict:bool=False,
+                  verbose:bool=False, dirty:bool=False, profile:str=None
+                  ) -> Tuple[BuildResult, List[Tuple[str, str]]]:
+    """
+    Run the MkDocs build within the current Python interpreter
+    (in the current directory), with MkDocs' own API.
+
+    This saves the start of a new interpreter and the import of mkdocs,
+    markdown, the theme and the plugins at each build.
+
+    Arguments:
+        config_file: the config file (default: mkdocs.yml)
+        strict: to make the build fail in case of warnings
+        verbose: to log DEBUG entries
+        dirty: to rebuild only the pages that changed
+        profile: a file where the stats of cProfile are written
+            (the build is then run under cProfile)
+
+    Returns:
+        - the low level result (as if it had been run as a command),
+          where the stderr contains the log, and the resource usage
+          is that of the current process (CPU time during the build,
+          peak memory since the start of the process)
+        - the log records, as (severity, message) pairs
+    """
+    global inprocess_builds
+    inprocess_builds += 1
+    # imported here, so that mkdocs is loaded only if needed
+    from mkdocs import utils
+    from mkdocs.config import load_config, config_options
+    from mkdocs.commands import build
+    from mkdocs.exceptions import Abort, MkDocsException
+
+    # MkDocs caches the hooks modules: make sure they are reloaded
+    load_hook = getattr(config_options.Hooks, '_load_hook', None)
+    if hasattr(load_hook, 'cache_clear'):
+        load_hook.cache_clear()
+
+    command = build_command(strict=strict, verbose=verbose, dirty=dirty)
+    print("BUILD (in-process):", command)
+    # Same setup of the logger as the command line
+    logger = logging.getLogger('mkdocs')
+    old_level, old_propagate = logger.level, logger.propagate
+    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    logger.propagate = False
+    capture = LogCapture()
+    logger.addHandler(capture)
+    duplicate_filter = utils.DuplicateFilter()
+    build.log.addFilter(duplicate_filter)
+
+    returncode = 0
+    stdout = ''
+    errors = []
+    rusage = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+    profiler = cProfile.Profile() if profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        cfg = load_config(config_file, strict=strict or None)
+        cfg.plugins.on_startup(command='build', dirty=dirty)
+        try:
+            build.build(cfg, dirty=dirty)
+        finally:
+            cfg.plugins.on_shutdown()
+    except Abort as e:
+        returncode = e.code
+        stdout = f'\n{e.format_message()}\n'
+    except MkDocsException as e:
+        returncode = e.exit_code
+        errors.append(f"Error: {e.format_message()}")
+    except Exception:
+        returncode = 1
+        errors.append(traceback.format_exc().rstrip())
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(os.path.abspath(profile)), exist_ok=True)
+            profiler.dump_stats(profile)
+        build.log.removeFilter(duplicate_filter)
+        logger.removeHandler(capture)
+        logger.setLevel(old_level)
+        logger.propagate = old_propagate
+
+    stderr = ''.join(f'{item}\n' for item in [capture.trace] + errors if item)
+    usage = None
+    if resource:
+        usage = make_usage(resource.getrusage(resource.RUSAGE_SELF), rusage)
+    result = BuildResult(command, returncode, stdout=stdout, stderr=stderr,
+                         usage=usage)
+    return result, capture.records
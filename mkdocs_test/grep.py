@@ -0,0 +1,160 @@
+"""
+Site-wide search (grep) over the files of a built MkDocs project.
+
+The files are memory-mapped, and the work is split across processes.
+When the pattern is a literal that can be matched against the raw bytes
+of a file, a file where it does not appear is skipped without decoding
+or parsing. The lines are always matched as text, one by one.
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+import re
+import gzip
+import json
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple
+
+from .common import parse_html, get_html_parser
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"Where to search: final HTML page, markdown (after plugins), plain text"
+GREP_HTML = 'html'
+GREP_MARKDOWN = 'markdown'
+GREP_TEXT = 'text'
+GREP_MODES = [GREP_HTML, GREP_MARKDOWN, GREP_TEXT]
+
+"Below that number of files, the search is done in the current process"
+PARALLEL_THRESHOLD = 64
+
+"Special characters of regexes (a pattern without them is a literal)"
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+"Characters that may be escaped in HTML or JSON files"
+ESCAPED_CHARS = set('&<>"\'\\\n\r\t')
+
+
+def is_raw_literal(pattern:str) -> bool:
+    """
+    Predicate: can the pattern be searched as such in the raw bytes
+    of a file (HTML or JSON), to know whether the file must be parsed?
+    It must be a literal made of ASCII characters that are never escaped.
+    """
+    return (pattern.isascii() and
+            not REGEX_CHARS.intersection(pattern) and
+            not ESCAPED_CHARS.intersection(pattern))
+
+
+def grep_lines(text:str, regex:re.Pattern) -> List[str]:
+    "The lines of a text that match a regex (stripped)"
+    return [line.strip() for line in text.splitlines() if regex.search(line)]
+
+
+# ---------------------------
+# Search in one file
+# ---------------------------
+
+def _open_mmap(filename:str):
+    "Memory-map a file (None if empty)"
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def grep_file(filename:str, pattern:str, in_:str=GREP_HTML,
+              parser:str=None) -> List[str]:
+    """
+    Find the lines of a file that match a pattern (regex, case-insensitive).
+
+    Arguments:
+        filename: the HTML page (html or text), possibly compressed
+            with gzip (.gz), or the record of the page exported by the
+            test plugin (markdown)
+        pattern: the regex
+        in_: where to search (html, markdown, text)
+        parser: the HTML parser (text)
+    """
+    if filename.endswith('.gz'):
+        with gzip.open(filename, 'rt', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+    else:
+        mm = _open_mmap(filename)
+        if mm is None:
+            return []
+        with mm:
+            if is_raw_literal(pattern):
+                # no need to decode the file, if the pattern is not there
+                raw_regex = re.compile(re.escape(pattern.encode()), re.IGNORECASE)
+                if not raw_regex.search(mm):
+                    return []
+            content = mm[:].decode('utf-8', errors='replace')
+    regex = re.compile(pattern, re.IGNORECASE)
+    if in_ == GREP_HTML:
+        text = content
+    elif in_ == GREP_MARKDOWN:
+        text = json.loads(content).get('markdown') or ''
+    else:
+        soup = parse_html(content, parser)
+        text = soup.get_text(separator='\n', strip=True)
+    return grep_lines(text, regex)
+
+
+def grep_files(files:List[Tuple[str, str]], pattern:str,
+               in_:str=GREP_HTML, parser:str=None) -> List[Tuple[str, str]]:
+    "Search a list of (key, filename); return the (key, line) hits"
+    return [(key, line) for key, filename in files
+            for line in grep_file(filename, pattern, in_, parser)]
+
+
+# ---------------------------
+# Search in all files
+# ---------------------------
+
+def grep(files:Dict[str, str], pattern:str, in_:str=GREP_HTML,
+         workers:int=None, parser:str=None) -> List[Tuple[str, str]]:
+    """
+    Search a pattern in a set of files, split across processes.
+
+    Arguments:
+        files: the files (key -> filename)
+        pattern: the regex (case-insensitive)
+        in_: where to search (html, markdown, text)
+        workers: the number of processes (default: number of CPUs);
+            small sets of files are searched in the current process.
+        parser: the HTML parser (text); default: see set_html_parser()
+
+    Returns:
+        The (key, line) hits, in the order of the files
+    """
+    if in_ not in GREP_MODES:
+        raise ValueError(f"Cannot search in '{in_}' (must be one of {GREP_MODES})")
+    # check the pattern (here, rather than in the workers)
+    re.compile(pattern)
+    files = [(key, filename) for key, filename in files.items()
+             if os.path.isfile(filename)]
+    # resolved here, since the workers do not share the default
+    parser = parser or get_html_parser()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) < PARALLEL_THRESHOLD:
+        return grep_files(files, pattern, in_, parser)
+    # split into chunks (several per worker, for balance)
+    n_chunks = workers * 4
+    chunks = [files[i::n_chunks] for i in range(n_chunks) if files[i::n_chunks]]
+    hits = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_hits in executor.map(grep_files, chunks,
+                                       [pattern] * len(chunks),
+                                       [in_] * len(chunks),
+                                       [parser] * len(chunks)):
+            for key, line in chunk_hits:
+                hits.setdefault(key, []).append(line)
+    return [(key, line) for key, _ in files for line in hits.get(key, [])]
@@ -7,14 +7,20 @@
 # --------------------------------------------
 
 import os
+import re
 import json
+import gzip
+import shutil
 import logging
+import traceback
+from fnmatch import fnmatch
 
 from bs4 import BeautifulSoup 
 from mkdocs.config.defaults import MkDocsConfig
 from mkdocs.structure.files import Files
 from super_collections import SuperDict
 
+from mkdocs.config import config_options
 from mkdocs.plugins import BasePlugin
 from mkdocs.structure.pages import Page
 from mkdocs.structure.nav import Navigation
@@ -23,12 +29,21 @@ try:
 except ImportError:
     event_priority = lambda priority: lambda f: f  # No-op fallback
 
-from .common import TEST_DIRNAME, DOCS_DEFAULT_DIRNAME, PAGE_MAP, get_frontmatter
+from .common import (TEST_DIRNAME, DOCS_DEFAULT_DIRNAME, PAGE_MAP,
+                     PAGE_INDEX, PAGES_DIRNAME, PAGE_DB, LOG_FILE, TIMINGS_FILE,
+                     TIMELINE_FILE, TIMELINE_ENV, TEMPLATES_FILE, JINJA_CACHE_DIRNAME,
+                     MARKDOWN_PROFILE_FILE, get_frontmatter, get_headers, parse_html)
+from .store import PageStore
+from .profiling import EventTimer, Timeline, TemplateProfiler, MarkdownProfiler
 
 
 
 
 LOWEST_PRIORITY = -90
+HIGHEST_PRIORITY = 100
+
+"The fields of a page that can be selected for export (option `fields`)"
+EXPORT_FIELDS = ['markdown', 'content', 'meta', 'file', 'outline']
 
 
 # ------------------------------------------
@@ -50,10 +65,111 @@ def convert_object(object) -> SuperDict:
                 isinstance(value, (str, int, float, dict))}
     return SuperDict(d)
 
+def normalize_header(text:str) -> str:
+    "Normalize the text of a header, for comparison (no markup, spaces, case)"
+    return re.sub(r'\W+', '', text or '').lower()
+
+def get_outline(toc, markdown:str=None) -> list:
+    """
+    Convert the table of contents of a page into a compact outline:
+    a list of headers (level, id, title, line, children).
+
+    The line is the line of the header in the markdown 
+    (after the plugins), if it can be found (same level, and
+    its text contains the title); otherwise None (e.g. a header
+    within an admonition).
+    """
+    lines = (markdown or '').splitlines()
+    headers = get_headers(markdown or '')
+    position = 0
+
+    def find_line(item) -> int:
+        "Find the line of a header, after the headers already found"
+        nonlocal position
+        title = normalize_header(item.title)
+        if not title:
+            return None
+        # the headers are in the same order as the markdown lines
+        for i in range(position, len(headers)):
+            lineno, level = headers[i]
+            if (level == item.level and 
+                    title in normalize_header(lines[lineno - 1])):
+                position = i + 1
+                return lineno
+
+    def convert(items) -> list:
+        outline = []
+        for item in items:
+            outline.append({'level': item.level, 'id': item.id, 
+                            'title': item.title, 'line': find_line(item),
+                            'children': convert(item.children)})
+        return outline
+
+    return convert(toc or [])
+
 def check_dir(dest_file:str):
     "Check that the directories of a destination file exist"
     os.makedirs(os.path.dirname(dest_file), exist_ok=True)
 
+def write_json(dest_file:str, obj, compact:bool=True):
+    "Write an object into a json file"
+    check_dir(dest_file)
+    with open(dest_file, 'w') as f:
+        if compact:
+            json.dump(obj, f, separators=(',', ':'))
+        else:
+            json.dump(obj, f, indent=4)
+
+def write_output(dest_file:str, output:str):
+    "Write the output of a page (compressed with gzip, if the file ends with .gz)"
+    check_dir(dest_file)
+    if dest_file.endswith('.gz'):
+        with gzip.open(dest_file, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(output)
+    else:
+        with open(dest_file, 'w', encoding='utf-8') as f:
+            f.write(output)
+
+class JsonLogHandler(logging.Handler):
+    """
+    Logging handler that writes each record of the mkdocs logger
+    hierarchy into a file, as a JSON line: logger name, level, message,
+    exception text and page being processed at that moment (src_uri).
+    The file is buffered: it is flushed at the end of the build
+    (or on a build error) and when the handler is closed.
+    """
+
+    def __init__(self, filename:str, config:MkDocsConfig):
+        super().__init__()
+        check_dir(filename)
+        self._file = open(filename, 'w', encoding='utf-8')
+        self._config = config
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            # MkDocs keeps track of the page being processed
+            page = getattr(self._config, '_current_page', None)
+            exc_text = None
+            if record.exc_info:
+                exc_text = ''.join(traceback.format_exception(*record.exc_info))
+                exc_text = exc_text.rstrip()
+            entry = {'logger': record.name, 'level': record.levelname,
+                     'message': record.getMessage(), 'exc_text': exc_text,
+                     'page': page.file.src_uri if page else None}
+            self._file.write(json.dumps(entry) + '\n')
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        with self.lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+        super().close()
+
 # ------------------------------------------
 # Plugin
 # ------------------------------------------
@@ -63,6 +179,41 @@ class TestPlugin(BasePlugin):
     for testing MkDocs project
     """
 
+    config_scheme = (
+        # also export all pages into one file (page_map.json)
+        ('page_map', config_options.Type(bool, default=True)),
+        # also export the pages into a SQLite database (pages.db)
+        ('sqlite', config_options.Type(bool, default=False)),
+        # also export the final output (HTML) of each page
+        ('output', config_options.Type(bool, default=False)),
+        # compress the output (gzip)
+        ('compress', config_options.Type(bool, default=False)),
+        # the pages to export (globs on the src_uri; default: all)
+        ('include', config_options.ListOfItems(config_options.Type(str), 
+                                               default=[])),
+        # the pages not to export (globs on the src_uri)
+        ('exclude', config_options.ListOfItems(config_options.Type(str), 
+                                               default=[])),
+        # a front-matter flag that forces the export of a page (or not)
+        ('flag', config_options.Optional(config_options.Type(str))),
+        # the fields exported (the others are set to null)
+        ('fields', config_options.ListOfItems(
+                        config_options.Choice(EXPORT_FIELDS),
+                        default=EXPORT_FIELDS)),
+        # write the log as JSON lines (log.jsonl)
+        ('json_log', config_options.Type(bool, default=False)),
+        # time the event handlers of all plugins (timings.json)
+        ('timings', config_options.Type(bool, default=False)),
+        # record the timeline of the build (timeline.json)
+        ('timeline', config_options.Type(bool, default=False)),
+        # profile the rendering of the templates (templates.json)
+        ('templates', config_options.Type(bool, default=False)),
+        # keep the compiled templates across builds (jinja_cache)
+        ('bytecode_cache', config_options.Type(bool, default=False)),
+        # profile the processors of the markdown extensions (markdown_profile.json)
+        ('markdown_profile', config_options.Type(bool, default=False)),
+    )
+
     # ----------------------------
     # Directories
     # ----------------------------
@@ -86,6 +237,11 @@ class TestPlugin(BasePlugin):
         except AttributeError:
             raise AttributeError("Trying to access the nav attribute too early")
 
+    @property
+    def dirty(self) -> bool:
+        "Is this a dirty build (only the modified pages are rebuilt)?"
+        return getattr(self, '_dirty', False)
+
     @property
     def source_markdown(self) -> SuperDict:
         "The table raw (target) markdown (used to complement the page table)"
@@ -95,41 +251,329 @@ class TestPlugin(BasePlugin):
             self._source_markdown = SuperDict()
             return self._source_markdown      
 
+    @property
+    def pages_dir(self) -> str:
+        "The directory where the pages are exported one by one"
+        return os.path.join(self.test_dir, PAGES_DIRNAME)
+
+    @property
+    def exported(self) -> dict:
+        "The pages exported during this build (src_uri -> index entry)"
+        try:
+            return self._exported
+        except AttributeError:
+            self._exported = {}
+            return self._exported
+
+    @property
+    def with_timeline(self) -> bool:
+        """
+        Must the timeline of the build be recorded? 
+        (option `timeline`, or environment variable set by DocProject.build())
+        """
+        return self.config['timeline'] or bool(os.environ.get(TIMELINE_ENV))
+
+    @property
+    def template_profiler(self) -> TemplateProfiler:
+        "The profiler of the templates (None if not required)"
+        return getattr(self, '_template_profiler', None)
+
+    @property
+    def markdown_profiler(self) -> MarkdownProfiler:
+        "The profiler of the markdown conversion (None if not required)"
+        return getattr(self, '_markdown_profiler', None)
+
+    @property
+    def store(self) -> PageStore:
+        "The SQLite store of the pages (None if not required)"
+        return getattr(self, '_store', None)
+
     # ----------------------------
     # Pages
     # ----------------------------
+    def is_exported(self, page:Page) -> bool:
+        """
+        Is a page selected for export? 
+        A front-matter flag (option `flag`) has precedence over
+        the globs on the src_uri (options `include` and `exclude`).
+        """
+        flag = self.config['flag']
+        if flag and flag in (page.meta or {}):
+            return bool(page.meta[flag])
+        src_uri = page.file.src_uri
+        include = self.config['include']
+        if include and not any(fnmatch(src_uri, pattern) for pattern in include):
+            return False
+        return not any(fnmatch(src_uri, pattern) 
+                       for pattern in self.config['exclude'])
+
+    def get_page_record(self, page:Page) -> SuperDict:
+        "The record of a page (what is exported)"
+        # make sure that the (cached) paths are computed
+        page.file.abs_src_path, page.file.abs_dest_path
+        d = convert_object(page)
+        d.file = convert_object(page.file)
+        d.outline = get_outline(page.toc, page.markdown)
+        if self.template_profiler:
+            d.render_time = self.template_profiler.pages.get(page.file.src_uri)
+        if self.markdown_profiler:
+            d.markdown_profile = self.markdown_profiler.pages.get(page.file.src_uri)
+        for field in EXPORT_FIELDS:
+            if field not in self.config['fields']:
+                d[field] = None
+        return d
+
+    def get_index_entry(self, page:Page) -> dict:
+        """
+        The entry of a page in the index (record file, source and destination,
+        and output file if required)
+        """
+        entry = {'record': f"{page.file.src_uri}.json",
+                 'src_path': page.file.abs_src_path,
+                 'dest_path': page.file.abs_dest_path}
+        if self.config['output']:
+            entry['output'] = f"{page.file.src_uri}.html"
+            if self.config['compress']:
+                entry['output'] += '.gz'
+        return entry
+
+    @staticmethod
+    def get_skipped_entry(page:Page) -> dict:
+        "The (lightweight) entry in the index of a page that is not exported"
+        return {'record': None,
+                'src_path': page.file.abs_src_path,
+                'dest_path': page.file.abs_dest_path}
+
+    def export_page(self, page:Page, output:str=None):
+        "Export the record of a page (and its output) into their own files"
+        entry = self.get_index_entry(page)
+        if 'output' in entry:
+            write_output(os.path.join(self.pages_dir, entry['output']),
+                         output or '')
+        write_json(os.path.join(self.pages_dir, entry['record']),
+                   self.get_page_record(page))
+        self.exported[page.file.src_uri] = entry
+
+    def store_page(self, page:Page, output:str):
+        "Add a page to the SQLite store"
+        text = parse_html(page.content or '').get_text()
+        self.store.add_page(page.file.src_uri, page.title, page.meta,
+                            markdown=page.markdown, content=page.content,
+                            text=text, dest_path=page.file.dest_uri,
+                            size=len(output.encode('utf-8')))
+
+    def close_store(self):
+        "Commit and close the SQLite store (if any)"
+        if self.store:
+            self.store.commit()
+            self.store.close()
+            self._store = None
+
+    def write_index(self, index:dict) -> str:
+        "Write the index of the exported pages (src_uri -> entry)"
+        out_file = os.path.join(self.test_dir, PAGE_INDEX)
+        write_json(out_file, index, compact=False)
+        return out_file
+
+    def get_previous_page_map(self) -> dict:
+        "The page map exported by the previous build (empty if none)"
+        out_file = os.path.join(self.test_dir, PAGE_MAP)
+        try:
+            with open(out_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
     def get_page_map(self) -> SuperDict:
         """
         Recursively build the mapping of pages from 
         self.nav: all pages, created by on_nav().
+
+        In a dirty build, the pages that were not rebuilt 
+        (their markdown was not read) are taken from the previous page map.
         """
-        pages = []
+        previous = self.get_previous_page_map() if self.dirty else {}
+        pages = {}
         for page in self.nav.pages:
-            d = convert_object(page)
-            d.file = convert_object(page.file)
-            pages.append(d)
-        return SuperDict({page.file.src_uri: page for page in pages})
+            src_uri = page.file.src_uri
+            if page.markdown is None and src_uri in previous:
+                pages[src_uri] = previous[src_uri]
+            elif not self.is_exported(page):
+                continue
+            else:
+                pages[src_uri] = self.get_page_record(page)
+        return SuperDict(pages)
 
     # ----------------------------
     # Handling events
     # ----------------------------
+    def open_log(self, config:MkDocsConfig):
+        "Start writing the log, as JSON lines"
+        self.close_log()
+        self._log_handler = JsonLogHandler(os.path.join(self.test_dir, LOG_FILE),
+                                           config)
+        logging.getLogger('mkdocs').addHandler(self._log_handler)
+
+    def flush_log(self):
+        "Write the log buffered so far (if it is being written)"
+        handler = getattr(self, '_log_handler', None)
+        if handler:
+            handler.flush()
+
+    def close_log(self):
+        "Stop writing the log (if it was being written)"
+        handler = getattr(self, '_log_handler', None)
+        if handler:
+            logging.getLogger('mkdocs').removeHandler(handler)
+            handler.close()
+            self._log_handler = None
+
+    def start_timer(self, config:MkDocsConfig):
+        "Start timing the event handlers of all plugins (and the timeline)"
+        self._timeline = Timeline() if self.with_timeline else None
+        on_call = self._timeline.add_call if self._timeline else None
+        self._timer = EventTimer(on_call=on_call)
+        self._timer.instrument(config.plugins)
+        if self._timeline:
+            self._timeline.add_markers(config.plugins)
+
+    def write_profiles(self):
+        """
+        Write the timings of the event handlers, the timeline,
+        the profiles of the templates and of the markdown (if required)
+        """
+        timer = getattr(self, '_timer', None)
+        if timer and self.config['timings']:
+            write_json(os.path.join(self.test_dir, TIMINGS_FILE),
+                       timer.summary(), compact=False)
+        timeline = getattr(self, '_timeline', None)
+        if timeline:
+            write_json(os.path.join(self.test_dir, TIMELINE_FILE),
+                       timeline.to_trace())
+        if self.template_profiler:
+            write_json(os.path.join(self.test_dir, TEMPLATES_FILE),
+                       self.template_profiler.summary(), compact=False)
+        if self.markdown_profiler:
+            write_json(os.path.join(self.test_dir, MARKDOWN_PROFILE_FILE),
+                       self.markdown_profiler.summary(), compact=False)
+        self._timer = self._timeline = None
+        self._template_profiler = self._markdown_profiler = None
+
+    def on_startup(self, command, dirty):
+        "Register whether it is a dirty build"
+        self._dirty = dirty
+
+    @event_priority(HIGHEST_PRIORITY)
+    def on_config(self, config):
+        """
+        Start writing the log, as JSON lines, timing the plugins
+        and profiling the markdown conversion (if required)
+        """
+        if self.config['json_log']:
+            self.open_log(config)
+        for filename in (TIMINGS_FILE, TIMELINE_FILE, TEMPLATES_FILE, 
+                         MARKDOWN_PROFILE_FILE):
+            filename = os.path.join(self.test_dir, filename)
+            if os.path.isfile(filename):
+                # (from a previous build)
+                os.remove(filename)
+        if self.config['timings'] or self.with_timeline:
+            self.start_timer(config)
+        if self.config['markdown_profile']:
+            self._markdown_profiler = MarkdownProfiler(config)
+            config.markdown_extensions.append(self.markdown_profiler.extension)
+
+    def on_shutdown(self):
+        "Write the profiles and stop writing the log"
+        self.write_profiles()
+        self.close_log()
+
+    def on_pre_build(self, config):
+        "Remove the export of the previous build (except in a dirty build)"
+        self._exported = {}
+        if not self.dirty:
+            shutil.rmtree(self.pages_dir, ignore_errors=True)
+            for filename in (PAGE_INDEX, PAGE_MAP, PAGE_DB):
+                filename = os.path.join(self.test_dir, filename)
+                if os.path.isfile(filename):
+                    os.remove(filename)
+        if self.config['sqlite']:
+            db_file = os.path.join(self.test_dir, PAGE_DB)
+            check_dir(db_file)
+            self._store = PageStore(db_file)
+            self.store.create()
+
     @event_priority(LOWEST_PRIORITY)
     def on_nav(self, nav, config, files):
         "Set the nav"
         self._nav = nav
 
+    @event_priority(HIGHEST_PRIORITY)
+    def on_env(self, env, config, files):
+        """
+        Profile the templates and install the bytecode cache
+        (if required), before any template is loaded
+        """
+        self._template_profiler = None
+        if self.config['templates'] or self.config['bytecode_cache']:
+            self._template_profiler = TemplateProfiler()
+            cache_dir = None
+            if self.config['bytecode_cache']:
+                cache_dir = os.path.join(self.test_dir, JINJA_CACHE_DIRNAME)
+            self.template_profiler.instrument(env, cache_dir=cache_dir)
+
+    @event_priority(LOWEST_PRIORITY)
+    def on_post_page(self, output, page, config):
+        """
+        Export the page, as soon as it is finished
+        (so that it is available, even if the build fails later)
+        """
+        if self.is_exported(page):
+            self.export_page(page, output)
+            if self.store:
+                self.store_page(page, output)
+
     @event_priority(LOWEST_PRIORITY)
     def on_post_build(self, config):
         """
-        The most important action: export all pages
+        The most important action: export the index of the pages
         This method is called at the end of the build process
         """
-        mapping = self.get_page_map()
-        out_file = os.path.join(self.test_dir, PAGE_MAP)
+        index = {}
+        for page in self.nav.pages:
+            entry = self.get_index_entry(page)
+            # (in a dirty build, the record may come from a previous build)
+            if os.path.isfile(os.path.join(self.pages_dir, entry['record'])):
+                if ('output' in entry and not 
+                    os.path.isfile(os.path.join(self.pages_dir, entry['output']))):
+                    del entry['output']
+                index[page.file.src_uri] = entry
+            elif not self.is_exported(page):
+                index[page.file.src_uri] = self.get_skipped_entry(page)
+        out_file = self.write_index(index)
+        if self.dirty:
+            updated = len([src_uri for src_uri in index 
+                           if src_uri in self.exported])
+            log.info(fmt("Dirty build:", updated, "of", len(self.nav.pages), 
+                         "page(s) updated"))
+        if self.config['page_map']:
+            # all pages in one file
+            out_file = os.path.join(self.test_dir, PAGE_MAP)
+            write_json(out_file, self.get_page_map(), compact=False)
+        if self.store:
+            # (in a dirty build, the pages deleted since the last one)
+            self.store.keep_pages([src_uri for src_uri, entry in index.items()
+                                   if entry['record']])
+        self.close_store()
         log.info(fmt("Debug file:", out_file))
-        check_dir(out_file)
-        with open(out_file, 'w') as f:
-            json.dump(mapping, f, indent=4)
+        self.flush_log()
+
+    def on_build_error(self, error):
+        "Export the index of the pages exported so far"
+        if self.exported:
+            self.write_index(self.exported)
+        self.close_store()
+        self.flush_log()
 
 
 
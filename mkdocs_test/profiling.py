@@ -0,0 +1,659 @@
+"""
+Profiling of the builds, from within the test plugin:
+time spent in the event handlers of each plugin,
+timeline of the build (Chrome trace-event format),
+rendering of the templates (Jinja2), conversion
+of the markdown (processors of the extensions),
+and hotspots of the whole build (cProfile).
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import sysconfig
+import functools
+from typing import List, Dict, Tuple, Callable
+
+from jinja2 import FileSystemBytecodeCache
+from markdown import Markdown
+from markdown.extensions import Extension
+from markdown.preprocessors import Preprocessor
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"The percentiles reported for the durations"
+PERCENTILES = [50, 95]
+
+"The events where the page is the item (first argument), not a keyword"
+PAGE_ITEM_EVENTS = {'on_pre_page'}
+
+"The events that mark the boundaries of the phases of a build"
+MARKER_EVENTS = ['on_config', 'on_pre_build', 'on_files', 'on_nav', 'on_env',
+                 'on_pre_page', 'on_page_markdown', 'on_page_content',
+                 'on_page_context', 'on_post_page', 'on_post_build']
+
+"""
+The phases of a build: (name, start, end), where start and end are
+the 'start' or 'end' of the handlers of an event, or the start of
+the 'next' event.
+"""
+BUILD_PHASES = [
+    ('config', ('start', 'on_config'), ('end', 'on_config')),
+    ('files', ('end', 'on_pre_build'), ('end', 'on_files')),
+    ('nav', ('end', 'on_files'), ('end', 'on_nav')),
+    ('env', ('start', 'on_env'), ('end', 'on_env')),
+    # static files and templates of the theme (404.html, sitemap, etc.)
+    ('static', ('end', 'on_env'), ('next', 'on_env')),
+    ('post_build', ('start', 'on_post_build'), ('end', 'on_post_build')),
+]
+
+"The phases of each page (same format)"
+PAGE_PHASES = [
+    ('markdown', ('start', 'on_pre_page'), ('end', 'on_page_markdown')),
+    ('content', ('end', 'on_page_markdown'), ('end', 'on_page_content')),
+    ('template', ('start', 'on_page_context'), ('start', 'on_post_page')),
+    ('write', ('start', 'on_post_page'), ('next', 'on_post_page')),
+]
+
+"The compile times of the templates (kept in the bytecode cache directory)"
+COMPILE_TIMES_FILE = 'compile_times.json'
+
+"""
+The registries of processors of a Markdown object: 
+(name, attribute path, methods that are timed)
+"""
+MARKDOWN_REGISTRIES = [
+    ('preprocessors', 'preprocessors', ['run']),
+    ('blockprocessors', 'parser.blockprocessors', ['test', 'run']),
+    ('inlinepatterns', 'inlinePatterns', ['handleMatch']),
+    ('treeprocessors', 'treeprocessors', ['run']),
+    ('postprocessors', 'postprocessors', ['run']),
+]
+
+"The priority of the preprocessor that instruments the others (runs first)"
+PROFILER_PRIORITY = 1000
+
+"The directories of the installed distributions"
+PACKAGE_DIRS = ['site-packages', 'dist-packages']
+
+"The directory of the standard library"
+STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+"The threads of the timeline (tid -> name)"
+PHASES_TID = 1
+PLUGINS_TID = 2
+TIMELINE_THREADS = {PHASES_TID: 'phases', PLUGINS_TID: 'plugins'}
+
+
+def percentile(values:List[float], p:float) -> float:
+    "The p-th percentile of a sorted list of values (linear interpolation)"
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def summarize(durations:List[float]) -> Dict[str, float]:
+    "Summary of a list of durations (seconds): calls, total, percentiles, max"
+    durations = sorted(durations)
+    summary = {'calls': len(durations), 'total': sum(durations)}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = percentile(durations, p)
+    summary['max'] = durations[-1] if durations else None
+    return summary
+
+
+def get_page_uri(event:str, args:tuple, kwargs:dict) -> str:
+    "The src_uri of the page, from the arguments of an event handler (or None)"
+    page = kwargs.get('page')
+    if page is None and event in PAGE_ITEM_EVENTS and args:
+        page = args[0]
+    file = getattr(page, 'file', None)
+    return getattr(file, 'src_uri', None)
+
+
+# ---------------------------
+# Timing of the plugins
+# ---------------------------
+
+def get_handler_origin(handler:Callable) -> str:
+    """
+    The origin of an event handler, when MkDocs does not record it:
+    the class of the plugin (bound method), or else the module (hook).
+    """
+    owner = getattr(handler, '__self__', None)
+    if owner is not None:
+        return owner.__class__.__name__
+    return getattr(handler, '__module__', None) or '<unknown>'
+
+
+class EventTimer(object):
+    """
+    Times the event handlers of all the plugins of an MkDocs config
+    (including the hooks), with a high-resolution clock.
+
+    Usage (from a plugin):
+        timer = EventTimer()
+        timer.instrument(config.plugins)
+        ...
+        timings = timer.summary()
+
+    Arguments:
+        on_call: a function called after each call of a handler,
+            with the plugin name, the event, the start and end times
+            (perf_counter) and the src_uri of the page (or None)
+    """
+
+    def __init__(self, on_call:Callable=None):
+        # (plugin name, event) -> durations (seconds)
+        self._durations = {}
+        self.on_call = on_call
+
+    def wrap(self, plugin_name:str, event:str, method:Callable) -> Callable:
+        "Wrap an event handler, so that each call is timed"
+        durations = self._durations.setdefault((plugin_name, event), [])
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                durations.append(end - start)
+                if self.on_call:
+                    self.on_call(plugin_name, event, start, end,
+                                 get_page_uri(event, args, kwargs))
+
+        return timed
+
+    def instrument(self, plugins):
+        """
+        Wrap the event handlers registered in a collection of plugins
+        (MkDocs' PluginCollection); it can be done while an event
+        is running (the handlers are replaced in place).
+        """
+        # (before MkDocs 1.6, there is no record of the origins)
+        origins = getattr(plugins, '_event_origins', {})
+        for name, methods in plugins.events.items():
+            event = f'on_{name}'
+            for i, method in enumerate(methods):
+                plugin_name = origins.get(method) or get_handler_origin(method)
+                wrapper = self.wrap(plugin_name, event, method)
+                methods[i] = wrapper
+                # so that MkDocs still knows where the handler comes from
+                origins[wrapper] = plugin_name
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        The timings of the handlers that were called:
+        plugin -> event -> calls, total, p50, p95, max (seconds)
+        """
+        timings = {}
+        for (plugin_name, event), durations in self._durations.items():
+            if durations:
+                timings.setdefault(plugin_name, {})[event] = summarize(durations)
+        return timings
+
+
+# ---------------------------
+# Timeline of the build
+# ---------------------------
+
+class Timeline(object):
+    """
+    Timeline of a build, in the Chrome trace-event format
+    (can be loaded into Perfetto or chrome://tracing).
+
+    It contains the calls of the event handlers of the plugins
+    (see EventTimer) and the phases of the build (config, files, nav,
+    env, static, post_build, and for each page: markdown, content, 
+    template and write),
+    which are found from the boundaries of the events.
+
+    Usage (from a plugin):
+        timeline = Timeline()
+        timer = EventTimer(on_call=timeline.add_call)
+        timer.instrument(config.plugins)
+        timeline.add_markers(config.plugins)
+        ...
+        trace = timeline.to_trace()
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._calls = []
+        # groups of consecutive calls of handlers: [event, page, start, end]
+        self._groups = []
+
+    def _timestamp(self, t:float) -> float:
+        "Convert a time (perf_counter) into a timestamp (microseconds)"
+        return round((t - self._origin) * 1e6, 3)
+
+    def add_call(self, plugin_name:str, event:str, start:float, end:float,
+                 page:str=None):
+        "Add a call of a handler (a plugin name of None is a marker)"
+        if plugin_name is not None:
+            self._calls.append((plugin_name, event, start, end, page))
+        last = self._groups[-1] if self._groups else None
+        if last and last[0] == event and last[1] == page:
+            last[3] = end
+        else:
+            self._groups.append([event, page, start, end])
+
+    def add_markers(self, plugins):
+        """
+        Register a marker for each event of MARKER_EVENTS that has 
+        no handler in a collection of plugins (MkDocs' PluginCollection),
+        so that the boundaries of all phases are known.
+        """
+        for event in MARKER_EVENTS:
+            methods = plugins.events.get(event[len('on_'):])
+            if methods is None or methods:
+                continue
+            def marker(*args, event=event, **kwargs):
+                t = time.perf_counter()
+                self.add_call(None, event, t, t,
+                              get_page_uri(event, args, kwargs))
+            methods.append(marker)
+
+    def get_phases(self) -> List[Tuple[str, str, float, float]]:
+        "The phases of the build: (name, page, start, end)"
+        # (event, page) -> start, end, start of the next event
+        bounds = {}
+        for i, (event, page, start, end) in enumerate(self._groups):
+            following = self._groups[i + 1][2] if i + 1 < len(self._groups) else None
+            bounds[(event, page)] = {'start': start, 'end': end, 
+                                     'next': following}
+
+        def get_phase(name, page, start, end):
+            start = bounds.get((start[1], page), {}).get(start[0])
+            end = bounds.get((end[1], page), {}).get(end[0])
+            if start is not None and end is not None and end >= start:
+                return (name, page, start, end)
+
+        phases = [get_phase(name, None, start, end) 
+                  for name, start, end in BUILD_PHASES]
+        pages = []
+        for _, page, _, _ in self._groups:
+            if page is not None and page not in pages:
+                pages.append(page)
+        for page in pages:
+            phases.extend(get_phase(name, page, start, end)
+                          for name, start, end in PAGE_PHASES)
+        if self._groups:
+            phases.insert(0, ('build', None, self._groups[0][2], 
+                              max(group[3] for group in self._groups)))
+        return [phase for phase in phases if phase]
+
+    def _span(self, name:str, cat:str, tid:int, start:float, end:float,
+              args:dict) -> dict:
+        "A complete event of the trace"
+        return {'name': name, 'cat': cat, 'ph': 'X', 
+                'ts': self._timestamp(start), 
+                'dur': round((end - start) * 1e6, 3),
+                'pid': self._pid, 'tid': tid, 'args': args}
+
+    def to_trace(self) -> dict:
+        "The timeline, as a trace (Chrome trace-event format)"
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 
+                   'tid': tid, 'args': {'name': name}}
+                  for tid, name in TIMELINE_THREADS.items()]
+        for name, page, start, end in self.get_phases():
+            args = {'page': page} if page else {}
+            events.append(self._span(name, 'phase', PHASES_TID, 
+                                     start, end, args))
+        for plugin_name, event, start, end, page in self._calls:
+            args = {'plugin': plugin_name}
+            if page:
+                args['page'] = page
+            events.append(self._span(f'{plugin_name}.{event}', 'plugin', 
+                                     PLUGINS_TID, start, end, args))
+        events.sort(key=lambda event: event.get('ts', -1))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+# ---------------------------
+# Templates
+# ---------------------------
+
+class ProfiledBytecodeCache(FileSystemBytecodeCache):
+    """
+    A bytecode cache of Jinja2 templates, on disk, that registers
+    which templates were found in the cache (hits).
+    """
+
+    def __init__(self, directory:str):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory)
+        self.directory = directory
+        # template name -> found in cache?
+        self.hits = {}
+
+    def get_bucket(self, environment, name, filename, source):
+        bucket = super().get_bucket(environment, name, filename, source)
+        self.hits[name] = bucket.code is not None
+        return bucket
+
+
+class TemplateProfiler(object):
+    """
+    Profiles the templates of a Jinja2 environment (the theme of MkDocs):
+    render time per template and per page, and load time of each template
+    (compilation, or loading from the bytecode cache, if any).
+
+    Usage (from a plugin, in on_env):
+        profiler = TemplateProfiler()
+        profiler.instrument(env, cache_dir='__test__/jinja_cache')
+        ...
+        templates = profiler.summary()
+    """
+
+    def __init__(self):
+        # template name -> render durations (seconds)
+        self._renders = {}
+        # template name -> load duration (seconds)
+        self._loads = {}
+        self.pages = {}
+        self.bytecode_cache = None
+
+    def add_render(self, name:str, duration:float, page=None):
+        "Register the rendering of a template (for a page, or None)"
+        self._renders.setdefault(name, []).append(duration)
+        file = getattr(page, 'file', None)
+        if file is not None:
+            self.pages[file.src_uri] = self.pages.get(file.src_uri, 0) + duration
+
+    def instrument(self, env, cache_dir:str=None):
+        """
+        Instrument a Jinja2 environment, before any template is loaded.
+        If a directory is given, a bytecode cache is installed there,
+        so that the templates are compiled only once across builds.
+        """
+        profiler = self
+
+        class ProfiledTemplate(env.template_class):
+            "A template whose rendering is timed"
+
+            def render(self, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return super().render(*args, **kwargs)
+                finally:
+                    context = args[0] if args else kwargs
+                    profiler.add_render(self.name, time.perf_counter() - start,
+                                        context.get('page'))
+
+        env.template_class = ProfiledTemplate
+        if cache_dir:
+            self.bytecode_cache = ProfiledBytecodeCache(cache_dir)
+            env.bytecode_cache = self.bytecode_cache
+        if env.loader is not None:
+            load = env.loader.load
+            def timed_load(environment, name, globals=None):
+                start = time.perf_counter()
+                try:
+                    return load(environment, name, globals)
+                finally:
+                    self._loads[name] = time.perf_counter() - start
+            env.loader.load = timed_load
+
+    def _cache_summary(self) -> dict:
+        """
+        The hits and misses of the bytecode cache, and the time saved:
+        for each hit, the compile time (measured when it was a miss,
+        in a previous build) minus the load time.
+        The compile times of the misses are saved for the next builds.
+        """
+        cache = self.bytecode_cache
+        filename = os.path.join(cache.directory, COMPILE_TIMES_FILE)
+        try:
+            with open(filename, 'r') as f:
+                compile_times = json.load(f)
+        except (FileNotFoundError, ValueError):
+            compile_times = {}
+        saved = 0.0
+        for name, hit in cache.hits.items():
+            load_time = self._loads.get(name, 0.0)
+            if not hit:
+                compile_times[name] = load_time
+            elif name in compile_times:
+                saved += max(compile_times[name] - load_time, 0.0)
+        with open(filename, 'w') as f:
+            json.dump(compile_times, f, indent=4)
+        hits = sum(cache.hits.values())
+        return {'hits': hits, 'misses': len(cache.hits) - hits,
+                'load_time': sum(self._loads.values()),
+                'saved': saved}
+
+    def summary(self) -> dict:
+        """
+        The profile of the templates:
+        
+        - templates: template name -> calls, total, p50, p95, max
+          (rendering, in seconds) and load time (seconds)
+        - pages: src_uri -> render time (seconds)
+        - bytecode_cache: hits, misses, load time and time saved (seconds),
+          or None if there was no bytecode cache
+        """
+        templates = {}
+        for name in list(self._renders) + list(self._loads):
+            durations = self._renders.get(name, [])
+            templates[name] = {**summarize(durations),
+                               'load': self._loads.get(name)}
+        return {'templates': templates, 'pages': dict(self.pages),
+                'bytecode_cache': (self._cache_summary() 
+                                   if self.bytecode_cache else None)}
+
+
+# ---------------------------
+# Markdown
+# ---------------------------
+
+class _InstrumentProcessors(Preprocessor):
+    """
+    Preprocessor that runs first and instruments all the processors
+    of the Markdown object (including those registered after 
+    the extensions, e.g. by MkDocs); it leaves the lines unchanged.
+    """
+
+    def __init__(self, md:Markdown, profiler:'MarkdownProfiler'):
+        super().__init__(md)
+        self.profiler = profiler
+
+    def run(self, lines:List[str]) -> List[str]:
+        if not getattr(self.md, '_profiled', False):
+            self.profiler.instrument(self.md)
+            self.md._profiled = True
+        return lines
+
+
+class MarkdownProfiler(object):
+    """
+    Profiles the conversion of the pages from markdown to HTML:
+    cumulative time per processor (preprocessors, blockprocessors,
+    inline patterns, treeprocessors, postprocessors) and per page.
+
+    The times are inclusive: e.g. the inline patterns run within the 
+    `inline` treeprocessor, and the blockprocessors may be nested.
+
+    Usage (from a plugin, in on_config):
+        profiler = MarkdownProfiler(config)
+        config.markdown_extensions.append(profiler.extension)
+        ...
+        profile = profiler.summary()
+
+    Arguments:
+        config: the MkDocs config (to know the page being converted)
+    """
+
+    def __init__(self, config):
+        self._config = config
+        # src_uri -> registry -> processor name -> seconds
+        self.pages = {}
+        # (registry, processor name) -> module of the processor
+        self.modules = {}
+
+    @property
+    def extension(self) -> Extension:
+        "The markdown extension that instruments each Markdown object"
+        profiler = self
+
+        class ProfilerExtension(Extension):
+            def extendMarkdown(self, md:Markdown):
+                md.preprocessors.register(_InstrumentProcessors(md, profiler),
+                                          'profiler', PROFILER_PRIORITY)
+
+        return ProfilerExtension()
+
+    def wrap(self, times:Dict[str, float], name:str, method:Callable) -> Callable:
+        "Wrap a method of a processor, so that its time is added up"
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] = times.get(name, 0.0) + time.perf_counter() - start
+
+        return timed
+
+    def instrument(self, md:Markdown):
+        "Instrument the processors of a Markdown object (for the current page)"
+        page = getattr(self._config, '_current_page', None)
+        if page is None:
+            # (not the conversion of a page)
+            return
+        profile = self.pages.setdefault(page.file.src_uri, {})
+        for registry_name, path, methods in MARKDOWN_REGISTRIES:
+            registry = md
+            for attr in path.split('.'):
+                registry = getattr(registry, attr)
+            times = profile.setdefault(registry_name, {})
+            for name, processor in registry._data.items():
+                if isinstance(processor, _InstrumentProcessors):
+                    continue
+                self.modules[(registry_name, name)] = type(processor).__module__
+                for method in methods:
+                    setattr(processor, method,
+                            self.wrap(times, name, getattr(processor, method)))
+
+    def get_ranking(self) -> List[dict]:
+        """
+        The processors, the slowest first, over all the pages:
+        registry, name, module, total (seconds), number of pages,
+        slowest page
+        """
+        totals = {}
+        for src_uri, profile in self.pages.items():
+            for registry_name, times in profile.items():
+                for name, seconds in times.items():
+                    item = totals.setdefault((registry_name, name),
+                                {'registry': registry_name, 'name': name,
+                                 'module': self.modules.get((registry_name, name)),
+                                 'total': 0.0, 'pages': 0, 
+                                 'slowest_page': None, 'max': 0.0})
+                    item['total'] += seconds
+                    item['pages'] += 1
+                    if seconds >= item['max']:
+                        item['max'] = seconds
+                        item['slowest_page'] = src_uri
+        return sorted(totals.values(), key=lambda item: item['total'],
+                      reverse=True)
+
+    def summary(self) -> dict:
+        """
+        The profile of the markdown conversion:
+
+        - pages: src_uri -> registry -> processor -> seconds
+        - ranking: the processors, the slowest first (see get_ranking())
+        """
+        return {'pages': self.pages, 'ranking': self.get_ranking()}
+
+
+# ---------------------------
+# Hotspots (cProfile)
+# ---------------------------
+
+def get_package(filename:str, project_dir:str=None) -> str:
+    """
+    The package of a function, from the file name of its code
+    (as found in the stats of cProfile): the top-level package 
+    of an installed distribution (e.g. mkdocs, markdown, jinja2, 
+    or a plugin), 'project' (e.g. hooks), 'stdlib', 'builtins' or 'other'.
+    """
+    if filename == '~':
+        return 'builtins'
+    if filename.startswith('<frozen '):
+        return 'stdlib'
+    if filename.startswith('<'):
+        return 'other'
+    path = os.path.abspath(filename)
+    parts = path.split(os.sep)
+    for package_dir in PACKAGE_DIRS:
+        if package_dir in parts:
+            i = len(parts) - 1 - parts[::-1].index(package_dir)
+            if i + 1 < len(parts):
+                return os.path.splitext(parts[i + 1])[0]
+    if project_dir and path.startswith(os.path.abspath(project_dir) + os.sep):
+        return 'project'
+    if path.startswith(STDLIB_DIR + os.sep):
+        return 'stdlib'
+    # e.g. a package installed in editable mode
+    for directory in sys.path:
+        directory = os.path.abspath(directory or os.curdir)
+        if path.startswith(directory + os.sep):
+            return os.path.splitext(path[len(directory) + 1:].split(os.sep)[0])[0]
+    return 'other'
+
+
+def get_hotspots(filename:str, n:int=20, project_dir:str=None) -> dict:
+    """
+    The hotspots of a build, from the stats of cProfile.
+
+    Arguments:
+        filename: the stats file (.pstats)
+        n: the number of functions
+        project_dir: the project directory (for its hooks)
+
+    Returns:
+        - total: the total time (seconds)
+        - cumulative: the top n functions by cumulative time
+        - self: the top n functions by self time
+          (function, file, line, package, calls, tottime, cumtime)
+        - packages: the packages, by self time (package, tottime,
+          calls, functions)
+    """
+    stats = pstats.Stats(filename).stats
+    functions = []
+    packages = {}
+    for (file, line, name), (cc, nc, tt, ct, callers) in stats.items():
+        package = get_package(file, project_dir)
+        functions.append({'function': name, 'file': file, 'line': line,
+                          'package': package, 'calls': nc, 
+                          'tottime': tt, 'cumtime': ct})
+        item = packages.setdefault(package, {'package': package, 'tottime': 0.0,
+                                             'calls': 0, 'functions': 0})
+        item['tottime'] += tt
+        item['calls'] += nc
+        item['functions'] += 1
+    by_time = lambda key: lambda item: item[key]
+    return {'total': sum(item['tottime'] for item in functions),
+            'cumulative': sorted(functions, key=by_time('cumtime'), 
+                                 reverse=True)[:n],
+            'self': sorted(functions, key=by_time('tottime'), reverse=True)[:n],
+            'packages': sorted(packages.values(), key=by_time('tottime'),
+                               reverse=True)}
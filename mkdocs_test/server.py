@@ -0,0 +1,285 @@
+"""
+Warm build server ("zygote"), for repeated builds.
+
+A long-lived process imports mkdocs, markdown, jinja2,
+the theme and the plugins once; then it forks a clean child
+for each build request. The child runs the build in-process
+and sends back the result, then exits: no state
+(hooks, plugin globals) leaks from one build to the next.
+
+Caveat: the server is itself forked from the current (test) process,
+so that it inherits its state at that moment. If in-process builds 
+were run before, their state (e.g. module globals of the plugins) 
+is inherited by every build of the server (a warning is issued).
+Start the server first, e.g. in a session fixture:
+`get_build_server().start()`.
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import os
+import sys
+import json
+import atexit
+import warnings
+import logging
+import threading
+import traceback
+from multiprocessing import Pipe
+from typing import List, Tuple, Dict
+
+from .common import TEST_DIRNAME, PAGE_INDEX, set_environ
+from . import engine
+from .engine import build_command, run_inprocess, make_usage, BuildResult
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"The modules imported by the server, before any build"
+PRELOAD_MODULES = ['mkdocs', 'mkdocs.config', 'mkdocs.commands.build',
+                   'mkdocs.structure.pages', 'markdown', 'jinja2']
+
+
+def warm_up(config_file:str):
+    """
+    Load a config file (without building), so that the theme,
+    the markdown extensions and the plugins it declares are imported.
+    Errors are ignored (they will be reported by the build).
+    """
+    from mkdocs.config import load_config
+    logger = logging.getLogger('mkdocs')
+    old_level, old_propagate = logger.level, logger.propagate
+    logger.setLevel(logging.CRITICAL)
+    logger.propagate = False
+    old_dir = os.getcwd()
+    try:
+        os.chdir(os.path.dirname(os.path.abspath(config_file)))
+        load_config(config_file)
+    except BaseException:
+        pass
+    finally:
+        os.chdir(old_dir)
+        logger.setLevel(old_level)
+        logger.propagate = old_propagate
+
+
+def read_page_index(project_dir:str) -> Dict:
+    "Read the index of the pages exported by the test plugin (None if not found)"
+    filename = os.path.join(project_dir, TEST_DIRNAME, PAGE_INDEX)
+    if os.path.isfile(filename):
+        with open(filename, 'r') as f:
+            return json.load(f)
+
+
+# ---------------------------
+# Server
+# ---------------------------
+
+class BuildServer(object):
+    """
+    A fork server for MkDocs builds (POSIX only).
+
+    Usage:
+        server = BuildServer()
+        result, records, page_index = server.build(project_dir, config_file)
+        server.stop()
+    """
+
+    def __init__(self):
+        if not hasattr(os, 'fork'):
+            raise OSError("The build server requires os.fork() "
+                          "(not available on this platform)")
+        self._pid = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        "Is the server process running?"
+        return self._pid is not None
+
+    def start(self):
+        "Start the server process (done automatically, at the first build)"
+        if self.is_running:
+            return
+        if engine.inprocess_builds:
+            warnings.warn(f"The build server is started after "
+                          f"{engine.inprocess_builds} in-process build(s): "
+                          "their state is inherited by its builds "
+                          "(start it before)", RuntimeWarning, stacklevel=2)
+        # import before the fork, so that it is done once
+        for module in PRELOAD_MODULES:
+            __import__(module)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        server_conn, client_conn = Pipe()
+        pid = os.fork()
+        if pid == 0:
+            # in the server process
+            client_conn.close()
+            try:
+                self._serve(server_conn)
+            finally:
+                os._exit(0)
+        server_conn.close()
+        self._pid = pid
+        self._conn = client_conn
+
+    def stop(self):
+        "Stop the server process"
+        if not self.is_running:
+            return
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._reap()
+
+    def _reap(self):
+        "Wait for the end of the server process, and forget it"
+        self._conn.close()
+        try:
+            os.waitpid(self._pid, 0)
+        except ChildProcessError:
+            pass
+        self._pid = None
+        self._conn = None
+
+    def build(self, project_dir:str, config_file:str=None,
+              strict:bool=False, verbose:bool=False, dirty:bool=False,
+              env:Dict[str, str]=None, profile:str=None
+              ) -> Tuple[BuildResult, List[Tuple[str, str]], Dict]:
+        """
+        Build a project, in a clean child of the server
+        (with additional environment variables, if given, 
+        those whose value is None being unset; 
+        under cProfile, if a file is given for the stats).
+
+        Returns:
+            - the low level result (as if it had been run as a command),
+            - the log records, as (severity, message) pairs
+            - the index of the pages exported by the test plugin (or None)
+        """
+        request = {'project_dir': os.path.abspath(project_dir),
+                   'config_file': config_file,
+                   'strict': strict, 'verbose': verbose, 'dirty': dirty,
+                   'env': env or {},
+                   'profile': profile and os.path.abspath(profile)}
+        print("BUILD (fork server):", build_command(strict, verbose, dirty))
+        with self._lock:
+            for attempt in range(2):
+                self.start()
+                try:
+                    self._conn.send(request)
+                    reply = self._conn.recv()
+                    break
+                except (BrokenPipeError, ConnectionResetError, EOFError):
+                    # the server died: restart it (once)
+                    self._reap()
+                    if attempt:
+                        raise
+        result = BuildResult(reply['args'], reply['returncode'],
+                             stdout=reply['stdout'], stderr=reply['stderr'],
+                             usage=reply.get('usage'))
+        return result, reply['records'], reply['page_index']
+
+    # ---------------------------
+    # Server side
+    # ---------------------------
+
+    def _serve(self, conn):
+        "Main loop of the server process"
+        warmed_up = set()
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                # the client has gone
+                break
+            if request is None:
+                break
+            config_file = os.path.join(request['project_dir'],
+                                       request['config_file'] or 'mkdocs.yml')
+            if config_file not in warmed_up:
+                warm_up(config_file)
+                warmed_up.add(config_file)
+            conn.send(self._fork_build(request))
+
+    def _fork_build(self, request:dict) -> dict:
+        "Fork a child that performs the build, and get its result"
+        reader, writer = Pipe(duplex=False)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            # in the build process
+            reader.close()
+            try:
+                writer.send(self._run_build(request))
+            finally:
+                os._exit(0)
+        writer.close()
+        try:
+            reply = reader.recv()
+        except EOFError:
+            reply = None
+        reader.close()
+        # the resource usage of the child (not of the server)
+        _, status, rusage = os.wait4(pid, 0)
+        if reply is None:
+            # the child died without answering
+            reply = {'args': build_command(request['strict'], request['verbose'],
+                                          request['dirty']),
+                     'returncode': 1,
+                     'stdout': '',
+                     'stderr': f"Build process died unexpectedly (status {status})\n",
+                     'records': [], 'page_index': None}
+        reply['usage'] = make_usage(rusage)
+        return reply
+
+    @staticmethod
+    def _run_build(request:dict) -> dict:
+        "Run the build (in the child)"
+        project_dir = request['project_dir']
+        try:
+            os.chdir(project_dir)
+            set_environ(request['env'])
+            result, records = run_inprocess(request['config_file'],
+                                            strict=request['strict'],
+                                            verbose=request['verbose'],
+                                            dirty=request['dirty'],
+                                            profile=request['profile'])
+            return {'args': result.args,
+                    'returncode': result.returncode,
+                    'stdout': result.stdout, 'stderr': result.stderr,
+                    'records': records,
+                    'page_index': read_page_index(project_dir)}
+        except BaseException:
+            return {'args': build_command(request['strict'], request['verbose'],
+                                          request['dirty']),
+                    'returncode': 1, 'stdout': '',
+                    'stderr': traceback.format_exc(),
+                    'records': [], 'page_index': None}
+
+
+# ---------------------------
+# Default server
+# ---------------------------
+_server = None
+
+def get_build_server() -> BuildServer:
+    "Get the default build server (created at the first call)"
+    global _server
+    if _server is None:
+        _server = BuildServer()
+        atexit.register(stop_build_server)
+    return _server
+
+def stop_build_server():
+    "Stop the default build server (if it was started)"
+    if _server is not None:
+        _server.stop()
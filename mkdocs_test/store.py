@@ -0,0 +1,153 @@
+"""
+SQLite store of the pages, with a full-text search index (FTS5).
+
+It is written by the test plugin (option `sqlite`) and read
+by the DocProject object, for site-wide queries.
+
+Part of the test package.
+
+(C) Laurent Franceschetti 2025
+"""
+
+import json
+import sqlite3
+from typing import List
+
+from super_collections import SuperDict
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"Table of the pages"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    src_uri TEXT PRIMARY KEY,
+    title TEXT,
+    meta TEXT,
+    markdown TEXT,
+    content TEXT,
+    dest_path TEXT,
+    size INTEGER
+)
+"""
+
+"Full-text index of the pages (markdown and plain text of the content)"
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    src_uri UNINDEXED,
+    markdown,
+    text
+)
+"""
+
+"Query for the full-text search"
+SEARCH_QUERY = """
+SELECT pages.src_uri, pages.title,
+       snippet(pages_fts, -1, '[', ']', '...', 12) AS snippet
+FROM pages_fts JOIN pages ON pages.src_uri = pages_fts.src_uri
+WHERE pages_fts MATCH ?
+ORDER BY rank
+"""
+
+
+def has_fts5() -> bool:
+    "Is the FTS5 extension of SQLite available?"
+    try:
+        sqlite3.connect(':memory:').execute(
+            "CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# ---------------------------
+# Store
+# ---------------------------
+
+class PageStore(object):
+    """
+    A SQLite database of the pages of an MkDocs project:
+    one row per page, and a full-text index.
+    """
+
+    def __init__(self, filename:str):
+        self.filename = filename
+        self._conn = sqlite3.connect(filename)
+        self._conn.row_factory = sqlite3.Row
+        r = self._conn.execute("SELECT name FROM sqlite_master "
+                               "WHERE name = 'pages_fts'").fetchone()
+        self._fts = r is not None
+
+    @property
+    def fts(self) -> bool:
+        "Does the database have a full-text index?"
+        return self._fts
+
+    def create(self):
+        "Create the tables (if needed)"
+        self._conn.execute(SCHEMA)
+        if has_fts5():
+            self._conn.execute(FTS_SCHEMA)
+            self._fts = True
+        self._conn.commit()
+
+    def add_page(self, src_uri:str, title:str, meta:dict,
+                 markdown:str, content:str, text:str,
+                 dest_path:str, size:int):
+        "Add (or replace) a page"
+        self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (src_uri, title, json.dumps(meta, default=str),
+                            markdown, content, dest_path, size))
+        if self.fts:
+            self._conn.execute("DELETE FROM pages_fts WHERE src_uri = ?",
+                               (src_uri,))
+            self._conn.execute("INSERT INTO pages_fts VALUES (?, ?, ?)",
+                               (src_uri, markdown, text))
+
+    def keep_pages(self, src_uris:List[str]) -> int:
+        """
+        Delete the pages that are not in a list
+        (e.g. deleted from the project, since a previous build).
+
+        Returns:
+            The number of pages deleted
+        """
+        keep = set(src_uris)
+        deleted = [(row[0],) for row in 
+                   self._conn.execute("SELECT src_uri FROM pages")
+                   if row[0] not in keep]
+        self._conn.executemany("DELETE FROM pages WHERE src_uri = ?", deleted)
+        if self.fts:
+            self._conn.executemany("DELETE FROM pages_fts WHERE src_uri = ?",
+                                   deleted)
+        return len(deleted)
+
+    def commit(self):
+        "Commit the changes"
+        self._conn.commit()
+
+    def close(self):
+        "Close the database"
+        self._conn.close()
+
+    def query(self, sql:str, params=()) -> List[SuperDict]:
+        "Execute an SQL query and return the rows"
+        cursor = self._conn.execute(sql, params)
+        return [SuperDict(dict(row)) for row in cursor.fetchall()]
+
+    def search(self, text:str) -> List[SuperDict]:
+        """
+        Full-text search, on the markdown and the plain text of the pages.
+
+        Arguments:
+            text: an FTS5 query (words, "phrases", AND/OR/NOT, prefix*, etc.)
+
+        Returns:
+            The matching pages (src_uri, title, snippet), best matches first.
+        """
+        if not self.fts:
+            raise sqlite3.OperationalError("The full-text index is not available "
+                                           "(SQLite without FTS5)")
+        return self.query(SEARCH_QUERY, (text,))
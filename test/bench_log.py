@@ -0,0 +1,96 @@
+"""
+Benchmark of the log parser, on a large synthetic log
+(as produced by a verbose build).
+
+Usage:
+    python test/bench_log.py [number of entries]
+
+(C) Laurent Franceschetti 2025
+"""
+import re
+import sys
+import time
+import random
+
+from mkdocs_test import parse_log, iter_log
+from mkdocs_test.common import h1, h2, print, strip_ansi_colors
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"Number of entries of the synthetic log"
+ENTRIES = 200_000
+
+"Templates of the entries"
+TEMPLATES = [
+    "DEBUG   -  Reading: page_{n}.md",
+    "DEBUG   -  Running 1 `page_markdown` events",
+    "DEBUG   -  [macros] - Page title: Page {n}",
+    "INFO    -  [macros] - Rendering source page: page_{n}.md",
+    "\x1b[33mWARNING \x1b[0m-  [macros] - ERROR # _Macro Rendering Error_"
+    "\n\n_File_: `page_{n}.md`\n\n_UndefinedError_: 'foo' is undefined"
+    "\n\n```\nTraceback (most recent call last):\n"
+    "File \"plugin.py\", line 665, in render\n```",
+]
+
+
+def make_log(entries:int=ENTRIES, seed:int=0) -> str:
+    "Make a synthetic log"
+    rnd = random.Random(seed)
+    weights = [40, 30, 20, 9, 1]
+    templates = rnd.choices(TEMPLATES, weights, k=entries)
+    return '\n'.join(template.format(n=n) for n, template in enumerate(templates))
+
+
+def parse_log_previous(mkdocs_log: str) -> list:
+    "The previous implementation of parse_log() (two regexes per line)"
+    log_entries = []
+    current_entry = None
+    mkdocs_log = strip_ansi_colors(mkdocs_log.strip())
+    for line in mkdocs_log.split('\n'):
+        match = re.match(r'^([A-Z]+)\s+-\s+(.*)', line)
+        if match:
+            if current_entry:
+                log_entries.append(current_entry)
+            message = match.group(2)
+            source_match = re.match(r'^\[(.*?)\]\s+-\s+(.*)', message)
+            if source_match:
+                source, title = source_match.group(1), source_match.group(2)
+            else:
+                source, title = '', message
+            current_entry = {'severity': match.group(1), 'source': source,
+                             'title': title, 'payload': []}
+        elif current_entry:
+            current_entry['payload'].append(line)
+    if current_entry:
+        log_entries.append(current_entry)
+    for entry in log_entries:
+        entry['payload'] = '\n'.join(entry['payload']).strip()
+    return log_entries
+
+
+def timed(function, *args):
+    "Run a function and return its result and its duration (seconds)"
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(entries:int=ENTRIES):
+    h1("Benchmark of the log parser")
+    log = make_log(entries)
+    h2(f"{entries} entries, {log.count(chr(10)) + 1} lines, {len(log)} characters")
+    previous, previous_duration = timed(parse_log_previous, log)
+    current, duration = timed(parse_log, log)
+    _, count_duration = timed(lambda text: sum(1 for _ in iter_log(text)), log)
+    assert [dict(entry) for entry in current] == previous, "Different results"
+    print(f"Previous implementation:   {previous_duration:.3f} s")
+    print(f"parse_log():               {duration:.3f} s "
+          f"(x{previous_duration / duration:.1f})")
+    print(f"iter_log() (no list):      {count_duration:.3f} s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ENTRIES)
@@ -0,0 +1,94 @@
+"""
+Benchmark of the HTML parsers (backends of BeautifulSoup),
+on the pages generated by the test projects.
+
+Usage:
+    python test/bench_parsers.py [repeat]
+
+(C) Laurent Franceschetti 2025
+"""
+import os
+import sys
+import time
+
+from rich.table import Table
+
+from mkdocs_test import DocProject, list_doc_projects, INPROCESS_MODE
+from mkdocs_test.common import (h1, h2, print, parse_html, get_sections,
+                                check_html_parser, HTML_PARSERS)
+
+
+# ---------------------------
+# Initialization
+# ---------------------------
+
+"The directory of this file"
+REF_DIR = os.path.dirname(os.path.abspath(__file__))
+
+"Number of times each page is parsed"
+REPEAT = 20
+
+
+def available_parsers():
+    "The HTML parsers that are installed"
+    parsers = []
+    for parser in HTML_PARSERS:
+        try:
+            parsers.append(check_html_parser(parser))
+        except ValueError as e:
+            print(f"[yellow]{e} (skipped)")
+    return parsers
+
+
+def get_generated_pages():
+    "Build the test projects and get the HTML of their pages"
+    pages = []
+    for project_dir in list_doc_projects(REF_DIR):
+        project = DocProject(project_dir, path=REF_DIR)
+        project.build(mode=INPROCESS_MODE)
+        for page in project.pages.values():
+            pages.append(page.html)
+    return pages
+
+
+def bench(pages, parser:str, repeat:int) -> dict:
+    "Time the parsing and the usual queries on the pages (seconds)"
+    timings = {'parse': 0.0, 'find_all': 0.0, 'sections': 0.0, 'text': 0.0}
+    for _ in range(repeat):
+        for html in pages:
+            start = time.perf_counter()
+            soup = parse_html(html, parser)
+            parsed = time.perf_counter()
+            soup.find_all('a')
+            found = time.perf_counter()
+            get_sections(soup)
+            indexed = time.perf_counter()
+            soup.get_text(separator='\n', strip=True)
+            end = time.perf_counter()
+            timings['parse'] += parsed - start
+            timings['find_all'] += found - parsed
+            timings['sections'] += indexed - found
+            timings['text'] += end - indexed
+    return timings
+
+
+def main(repeat:int=REPEAT):
+    h1("Benchmark of the HTML parsers")
+    pages = get_generated_pages()
+    size = sum(len(html) for html in pages)
+    h2(f"{len(pages)} pages ({size} characters), parsed {repeat} times")
+    table = Table()
+    table.add_column('Parser', no_wrap=True)
+    for column in ('parse', 'find_all', 'sections', 'text', 'total'):
+        table.add_column(f"{column} (ms/page)", justify='right')
+    for parser in available_parsers():
+        timings = bench(pages, parser, repeat)
+        timings['total'] = sum(timings.values())
+        n = len(pages) * repeat
+        table.add_row(parser, *(f"{value / n * 1000:.3f}"
+                                for value in timings.values()))
+    print(table)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else REPEAT)
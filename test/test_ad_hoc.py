@@ -4,14 +4,78 @@ Testing a simple project which is built ad hoc
 
 (C) Laurent Franceschetti 2025 
 """
+import os
+import json
 import time
+import shutil
 
 import pytest
 
-from mkdocs_test import DocProject, lorem_ipsum
+from mkdocs_test import (DocProject, BuildCache, lorem_ipsum, parse_log,
+                         stop_build_server)
+from mkdocs_test.grep import PARALLEL_THRESHOLD
 from mkdocs_test.common import h1, h2, h3
 
 
+# ---------------------------
+# Projects built in a temporary directory
+# ---------------------------
+
+"The main page of the projects"
+MAIN_PAGE = "# Main Page\n\nHello world!"
+
+"The hooks file of the projects"
+HOOKS_FILE = 'hooks.py'
+
+
+def configure(project:DocProject, test:dict=None, plugins:list=None,
+              hooks:str=None, **config):
+    """
+    Write the config file of a project (theme: mkdocs).
+
+    Arguments:
+        test: the options of the test plugin
+        plugins: the other plugins
+        hooks: the content of a hooks file (declared in the config)
+        config: the other entries of the config file
+    """
+    plugins = list(plugins or [])
+    if test is not None:
+        plugins.append({'test': test})
+    if plugins:
+        config['plugins'] = plugins
+    if hooks is not None:
+        with open(os.path.join(project.project_dir, HOOKS_FILE), 'w') as f:
+            f.write(hooks)
+        config['hooks'] = [HOOKS_FILE]
+    name = os.path.basename(project.project_dir)
+    project.make_config(site_name=f"{name} site", theme='mkdocs', **config)
+
+
+def make_project(tmp_path, name:str, pages:dict=None, mode:str='inprocess',
+                 **config) -> DocProject:
+    """
+    Make a project in the temporary directory, with a main page,
+    and build it.
+
+    Arguments:
+        name: the name of the project directory
+        pages: the other pages: filename -> content, or (content, meta)
+        mode: the build mode (None: no build)
+        config: the arguments of configure()
+    """
+    project = DocProject(name, path=str(tmp_path), new=True)
+    project.add_source_page("index.md", MAIN_PAGE)
+    for filename, content in (pages or {}).items():
+        if isinstance(content, tuple):
+            project.add_source_page(filename, *content)
+        else:
+            project.add_source_page(filename, content)
+    configure(project, **config)
+    if mode:
+        project.build(mode=mode)
+    return project
+
 
 
 
@@ -67,6 +131,15 @@ def test_pages():
     entry = project.find_entry(source='test')
     print("---")
     print("Confirming export:", entry.title)
+    counts = project.log_counts()
+    assert counts['INFO'] == len(project.find_entries(severity='info'))
+    assert sorted(project.log_severities) == sorted(counts)
+    assert project.log_counts('source')['test'] >= 1
+    # order of the events
+    assert (project.first_index_of('building documentation') <
+            project.first_index_of('debug file', source='test') <
+            project.first_index_of('documentation built'))
+    assert project.first_index_of('no such entry') is None
 
     # ----------------
     # First page
@@ -97,6 +170,19 @@ def test_pages():
     assert not page.find_header('subtitle', 3)
     assert page.find_header('subtitle') # all levels
 
+    # test the outline (exported by the test plugin)
+    outline = page.outline
+    assert len(outline) == 1
+    assert outline[0].title == 'Second page'
+    subtitles = outline[0].children
+    assert [item.title for item in subtitles] == ['This is a subtitle',
+                                                 'Second header of level two']
+    assert subtitles[0].id == 'this-is-a-subtitle'
+    assert subtitles[0].level == 2
+    lines = page.markdown.splitlines()
+    for header in page.headers:
+        assert header.title in lines[header.line - 1]
+
     # test find_all; all headers of level 2:
     headers = page.find_all('h2')
     assert len(headers) == 2
@@ -106,4 +192,618 @@ def test_pages():
     assert page.find('h2').string == headers[0].string
 
     print("Delete:")
-    project.delete()
\ No newline at end of file
+    project.delete()
+
+def test_build_cache(tmp_path):
+    "Builds are restored from the cache, if nothing changed"
+    project = make_project(tmp_path, "cached", mode=None)
+    cache = BuildCache(str(tmp_path / 'cache'))
+
+    h2("First build (miss)")
+    project.build(mode='inprocess', cache=cache)
+    assert project.success
+    assert project.build_info.cache == 'miss'
+    assert cache.stats['entries'] == 1
+    trace = project.trace
+
+    h2("Second build (hit)")
+    os.remove(project.page_index_file)
+    project.build(mode='inprocess', cache=cache)
+    assert project.build_info.cache == 'hit'
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert project.trace == trace
+    assert project.find_entry('debug file', source='test')
+    page = project.get_page('index')
+    assert page.find_text('hello world')
+
+    h2("Change of source (miss)")
+    project.add_source_page("index.md", "# Main Page\n\nHello again!")
+    project.build(mode='inprocess', cache=cache)
+    assert project.build_info.cache == 'miss'
+    assert project.get_page('index').find_text('hello again')
+    assert cache.stats['entries'] == 2
+
+    h2("Change of an extra path (miss)")
+    data_file = tmp_path / 'cached' / 'data.json'
+    data_file.write_text('{"foo": 1}')
+    project.build(mode='inprocess', cache=cache, cache_paths=['data.json'])
+    assert project.build_info.cache == 'miss'
+    project.build(mode='inprocess', cache=cache, cache_paths=['data.json'])
+    assert project.build_info.cache == 'hit'
+    data_file.write_text('{"foo": 2}')
+    project.build(mode='inprocess', cache=cache, cache_paths=['data.json'])
+    assert project.build_info.cache == 'miss'
+
+    h2("Spooled trace (miss)")
+    project.build(mode='subprocess', cache=cache)
+    assert project.build_info.cache == 'miss'
+    project.build(mode='subprocess', cache=cache, spool=True)
+    assert project.build_info.cache == 'miss'
+    assert project.is_spooled
+    project.build(mode='subprocess', cache=cache)
+    assert project.build_info.cache == 'hit'
+    assert not project.is_spooled and project.trace == project.build_result.stderr
+
+    h2("Failed build (not kept)")
+    entries = cache.stats['entries']
+    configure(project, nav=['missing.md'])
+    for _ in range(2):
+        project.build(mode='inprocess', cache=cache, strict=True)
+        assert not project.success
+        assert project.build_info.cache == 'miss'
+    assert cache.stats['entries'] == entries
+
+    h2("Eviction")
+    cache.max_size = 1
+    assert cache.evict() == entries
+    assert cache.stats['entries'] == 0
+
+
+def test_cache_key_sources(tmp_path, monkeypatch):
+    "The key changes with the sources of local plugins, and extra paths"
+    from mkdocs_test import cache as cache_module
+    plugin_dir = tmp_path / 'my_plugin'
+    plugin_dir.mkdir()
+    (plugin_dir / 'plugin.py').write_text("VERSION = 1")
+    (plugin_dir / 'notes.md').write_text("Not a source file")
+    (tmp_path / 'main.py').write_text("def define_env(env): pass")
+    # a plugin installed in editable mode (same version, new code)
+    monkeypatch.setattr(cache_module, '_local_sources', 
+                        {'my-plugin': [str(plugin_dir)]})
+    config = {'plugins': ['search']}
+    key = lambda: cache_module.cache_key(str(tmp_path), 'mkdocs.yml', config,
+                                         extra_paths=['main.py', 'include'])
+    first = key()
+    (plugin_dir / 'notes.md').write_text("Changed")
+    assert key() == first
+    (plugin_dir / 'plugin.py').write_text("VERSION = 2")
+    second = key()
+    assert second != first
+    (tmp_path / 'main.py').write_text("def define_env(env): env.x = 1")
+    assert key() != second
+    second = key()
+    (tmp_path / 'include').mkdir()
+    (tmp_path / 'include' / 'snippet.md').write_text("Hello")
+    assert key() != second
+
+
+def test_incremental_build(tmp_path):
+    "Only the pages that changed are rebuilt and reloaded"
+    project = make_project(tmp_path, "incremental",
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           nav=['index.md', 'second.md'])
+    assert project.success
+    index, second = project.get_page('index'), project.get_page('second')
+    assert second.find_text('foo') and index.soup
+
+    h2("Modify one page")
+    project.add_source_page("second.md", "# Second Page\n\nBar")
+    # make sure it is more recent than the html page
+    src_file = os.path.join(project.docs_dir, "second.md")
+    os.utime(src_file, (time.time() + 10, time.time() + 10))
+    project.build(mode='inprocess', incremental=True)
+    assert project.success
+    assert '--dirty' in project.build_result.args
+    entry = project.find_entry('dirty build', source='test')
+    assert '1 of 2' in entry.title
+    # the unchanged page object is kept, with its cache
+    assert project.get_page('index') is index
+    new_second = project.get_page('second')
+    assert new_second is not second
+    assert new_second.find_text('bar')
+    assert not new_second.find_text('foo')
+
+
+def test_lazy_pages(tmp_path):
+    "Pages are exported one by one, and loaded when accessed"
+    # the build fails at the second page
+    project = make_project(tmp_path, "lazy",
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           nav=['index.md', 'second.md'],
+                           test={'page_map': False},
+                           hooks="def on_post_page(output, page, config):\n"
+                                 "    if page.file.src_uri == 'second.md':\n"
+                                 "        raise ValueError('Failure')\n"
+                                 "    return output\n")
+    assert not project.success
+    # the page rendered before the failure is available
+    assert list(project.pages) == ['index.md']
+    assert project.get_page('index').find_text('hello world')
+    with pytest.raises(FileNotFoundError):
+        project.page_map_file
+
+    h2("Successful build")
+    configure(project, nav=['index.md', 'second.md'])
+    project.build(mode='inprocess')
+    assert project.success
+    pages = project.pages
+    assert len(pages) == 2 and 'second.md' in pages
+    assert not pages.loaded
+    assert pages['second.md'].find_text('foo')
+    assert list(pages.loaded) == ['second.md']
+    # the page map (all pages in one file) was also exported, by default
+    assert os.path.isfile(project.page_map_file)
+
+
+def test_page_output(tmp_path):
+    "The final output of the pages is captured by the test plugin"
+    project = make_project(tmp_path, "output", mode=None,
+                           pages={"other/second.md": "# Second Page\n\nFoo"})
+    for compress, extension in ((False, '.html'), (True, '.html.gz')):
+        h2(f"Output (compressed: {compress})")
+        configure(project, test={'output': True, 'compress': compress})
+        project.build(mode='inprocess')
+        assert project.success
+        index = project.pages.index
+        assert index['other/second.md']['output'] == 'other/second.md' + extension
+        # the site directory is no longer needed
+        site_dir = os.path.join(project.project_dir, 'site')
+        html = project.get_page('second').html
+        with open(os.path.join(site_dir, 'other', 'second', 'index.html')) as f:
+            assert html == f.read()
+        shutil.rmtree(site_dir)
+        page = project.get_page('index')
+        assert page.find_text('hello world')
+        assert '<title>' in page.html
+        # searched in the copies of the pages
+        assert len(project.grep('<title>', in_='html')) == 2
+        assert project.grep('foo', in_='text')[0][0].file.src_uri == 'other/second.md'
+
+
+def test_find_header(tmp_path):
+    "Headers outside of the outline are found, and lines are not mixed up"
+    project = make_project(tmp_path, "headers",
+                           pages={"headers.md": "# Main Page\n\n"
+                                  "!!! note\n    ## Inside\n\n    Text\n\n"
+                                  "## Next\n\n### Deep\n\nHello world!"},
+                           markdown_extensions=['admonition', 
+                                                {'toc': {'toc_depth': 2}}],
+                           plugins=['search'], test={})
+    assert project.success
+    page = project.get_page('headers')
+    lines = {header.title: header.line for header in page.headers}
+    assert 'Deep' not in lines
+    # (a header in an admonition is not found in the markdown)
+    assert lines == {'Main Page': 1, 'Inside': None, 'Next': 8}
+    # deeper than the toc_depth
+    assert page.find_header('Deep', 3) == 'Deep'
+    # not in the table of contents (theme)
+    assert page.find_header('Search')
+    assert page.find_header('Next', 2) == 'Next'
+    assert page.find_header('Nothing') is None
+
+
+def test_export_filters(tmp_path):
+    "Only some pages and some fields are exported"
+    project = make_project(tmp_path, "filters",
+                           pages={"api/first.md": "# First\n\nFoo",
+                                  "api/second.md": "# Second\n\nBar",
+                                  "other.md": ("# Other\n\nBaz", 
+                                               {'check': True})},
+                           test={'include': ['index.md', 'api/*'],
+                                 'exclude': ['api/second.md'],
+                                 'flag': 'check',
+                                 'fields': ['markdown', 'meta', 'file']})
+    assert project.success
+    pages = project.pages
+    assert sorted(pages) == ['api/first.md', 'index.md', 'other.md']
+    # the other pages are in the index, but not exported
+    assert list(pages.skipped) == ['api/second.md']
+    assert pages.skipped['api/second.md']['dest_path'].endswith('index.html')
+    assert not os.path.isfile(os.path.join(project.test_dir, 'pages',
+                                           'api', 'second.md.json'))
+    # only the fields required
+    page = project.get_page('first')
+    assert page.markdown.startswith('# First')
+    assert page.content is None
+    assert page['outline'] is None
+    # (the outline is then made from the HTML page)
+    assert page.find_header('First', 1)
+
+
+def test_stream_build(tmp_path):
+    "Streaming build, stopped at the first warning"
+    # a warning at the second page, then a (very) slow page
+    project = make_project(tmp_path, "stream", mode=None,
+                           pages={"second.md": "# Second Page\n\nFoo",
+                                  "third.md": "# Third Page\n\nBar"},
+                           nav=['index.md', 'second.md', 'third.md'],
+                           hooks="import time, logging\n"
+                                 "log = logging.getLogger('mkdocs.hooks')\n"
+                                 "def on_page_markdown(markdown, page, config, files):\n"
+                                 "    if page.file.src_uri == 'second.md':\n"
+                                 "        log.warning('[hook] - Something is wrong')\n"
+                                 "    elif page.file.src_uri == 'third.md':\n"
+                                 "        time.sleep(30)\n"
+                                 "    return markdown\n")
+    start = time.time()
+    project.build(mode='stream',
+                  stop_if=lambda entry: (entry.severity == 'WARNING' and 
+                                         entry.source == 'hook'))
+    assert time.time() - start < 20
+    assert not project.success
+    assert project.build_info.stopped
+    # the partial log is available
+    entry = project.find_entry('something is wrong', severity='warning')
+    assert entry.source == 'hook'
+    assert project.log[-1] is entry
+
+    h2("Without predicate")
+    configure(project, nav=['index.md', 'second.md', 'third.md'],
+              hooks="def on_page_markdown(markdown, page, config, files):\n"
+                    "    return markdown\n")
+    project.build(mode='stream')
+    assert project.success
+    assert project.find_entry('debug file', source='test')
+    assert project.log == parse_log(project.trace)
+    with pytest.raises(ValueError):
+        project.build(stop_if=lambda entry: True)
+
+
+def test_spooled_trace(tmp_path):
+    "The trace is spooled to a file, and the payloads are read lazily"
+    project = make_project(tmp_path, "spool", mode=None,
+                           hooks="import logging\n"
+                                 "log = logging.getLogger('mkdocs.hooks')\n"
+                                 "def on_post_build(config):\n"
+                                 "    log.warning('[hook] - Multiline"
+                                 "\\nFirst line\\nSecond line')\n")
+    for mode in ('subprocess', 'stream'):
+        h2(f"Spooled trace ({mode})")
+        project.build(mode=mode, spool=True, verbose=True)
+        assert project.success
+        assert project.is_spooled
+        assert project.build_result.stderr is None
+        assert os.path.isfile(project.trace_file)
+        # same result as parsing the trace
+        assert [dict(entry) for entry in project.log] == [
+                dict(entry) for entry in parse_log(project.trace)]
+        entry = project.find_entry('multiline', source='hook')
+        assert entry.severity == 'WARNING'
+        assert entry.payload == 'First line\nSecond line'
+        assert entry['payload'] == entry.payload
+        entry['payload'] = 'Changed'
+        assert entry.payload == 'Changed'
+        assert project.log_counts()['DEBUG'] > 0
+    with pytest.raises(ValueError):
+        project.build(mode='inprocess', spool=True)
+
+
+def test_json_log(tmp_path):
+    "The log is written by the test plugin, as JSON lines"
+    hooks = ("import logging\n"
+             "log = logging.getLogger('mkdocs.hooks')\n"
+             "def on_page_markdown(markdown, page, config, files):\n"
+             "    if page.file.src_uri == 'second.md':\n"
+             "        log.warning('[hook] - Problem\\nwith details')\n"
+             "        log.info('No source here')\n"
+             "    return markdown\n")
+    project = make_project(tmp_path, "json_log", mode=None,
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           hooks=hooks, test={'json_log': True})
+    for mode in ('subprocess', 'inprocess'):
+        h2(f"JSON log ({mode})")
+        project.build(mode=mode)
+        assert project.success
+        assert os.path.isfile(project.log_file)
+        entry = project.find_entry('problem', source='hook')
+        assert entry.severity == 'WARNING'
+        assert entry.payload == 'with details'
+        assert entry.page == 'second.md'
+        assert entry.logger == 'mkdocs.hooks'
+        entry = project.find_entry('no source here')
+        assert entry.source == '' and entry.page == 'second.md'
+        assert project.find_entry('debug file', source='test').page is None
+        assert project.find_entry('documentation built')
+    # the same entries as in the trace (after the config was loaded)
+    h2("Without JSON log")
+    titles = [(entry.severity, entry.source) for entry in project.log]
+    configure(project, hooks=hooks)
+    project.build()
+    assert not os.path.isfile(project.log_file)
+    assert [(entry.severity, entry.source) 
+            for entry in project.log][-len(titles):] == titles
+
+
+def test_build_stats(tmp_path):
+    "The resources used by a build are measured"
+    project = make_project(tmp_path, "build_stats", mode=None,
+                           pages={"second.md": "# Second Page\n\nFoo"})
+    for mode in ('subprocess', 'stream', 'inprocess'):
+        h2(f"Build stats ({mode})")
+        project.build(mode=mode)
+        stats = project.build_stats
+        print(stats)
+        assert stats.wall == project.build_info.duration
+        assert stats.pages == 2
+        assert stats.site_bytes > 0
+        if os.name == 'posix':
+            assert stats.user_cpu > 0
+            assert 0 < stats.peak_rss_mb < 800
+
+
+def test_plugin_timings(tmp_path):
+    "The event handlers of the plugins are timed"
+    project = make_project(tmp_path, "timings", mode=None,
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           hooks="import time\n"
+                                 "def on_page_markdown(markdown, page, config, files):\n"
+                                 "    time.sleep(0.01)\n"
+                                 "    return markdown\n",
+                           plugins=['search'], test={'timings': True})
+    for mode in ('subprocess', 'inprocess'):
+        h2(f"Plugin timings ({mode})")
+        project.build(mode=mode)
+        assert project.success
+        timings = project.plugin_timings
+        print(timings)
+        assert set(timings['search']) >= {'on_config', 'on_page_context',
+                                          'on_post_build'}
+        hook = next(events for name, events in timings.items() 
+                    if 'hooks' in name)
+        page_markdown = hook['on_page_markdown']
+        assert page_markdown.calls == 2
+        assert 0.01 <= page_markdown.p50 <= page_markdown.p95 <= page_markdown.max
+        assert page_markdown.total >= 0.02
+        assert timings['test']['on_post_page'].calls == 2
+        # a budget
+        assert timings['search']['on_post_build'].total < 5
+
+    h2("Not timed")
+    configure(project)
+    project.build()
+    assert not project.plugin_timings
+
+
+def test_timeline(tmp_path):
+    "The timeline of a build is recorded (Chrome trace-event format)"
+    project = make_project(tmp_path, "timeline", mode=None,
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           hooks="import time\n"
+                                 "def on_page_content(html, page, config, files):\n"
+                                 "    if page.file.src_uri == 'second.md':\n"
+                                 "        time.sleep(0.05)\n"
+                                 "    return html\n")
+    for mode in ('subprocess', 'inprocess', 'fork'):
+        h2(f"Timeline ({mode})")
+        project.build(mode=mode, trace=True)
+        assert project.success
+        with open(project.timeline_file) as f:
+            assert 'traceEvents' in json.load(f)
+        spans = project.timeline
+        phases = {(span.name, span.args.get('page')): span 
+                  for span in spans if span.cat == 'phase'}
+        for name in ('build', 'files', 'nav', 'static', 'post_build'):
+            assert (name, None) in phases
+        for page in ('index.md', 'second.md'):
+            for name in ('markdown', 'content', 'template', 'write'):
+                assert (name, page) in phases
+        # the outlier page
+        assert phases[('content', 'second.md')].dur >= 50_000
+        assert phases[('content', 'index.md')].dur < 50_000
+        hook = [span for span in spans if span.cat == 'plugin' 
+                and span.name.endswith('on_page_content')]
+        assert [span.args.page for span in hook] == ['index.md', 'second.md']
+        # spans are in chronological order and nested in the build
+        build = phases[('build', None)]
+        assert [span.ts for span in spans] == sorted(span.ts for span in spans)
+        assert all(build.ts <= span.ts <= build.ts + build.dur 
+                   for span in spans)
+
+    h2("Without timeline")
+    project.build(mode='inprocess')
+    assert not project.timeline
+    assert 'MKDOCS_TEST_TIMELINE' not in os.environ
+
+    h2("Without timeline, after a server started by a traced build")
+    stop_build_server()
+    project.build(mode='fork', trace=True)
+    assert project.timeline
+    project.build(mode='fork')
+    assert project.success
+    assert not project.timeline
+
+
+def test_template_profile(tmp_path):
+    "The rendering of the templates is profiled, with a bytecode cache"
+    h2("Template profile")
+    project = make_project(tmp_path, "templates",
+                           pages={"second.md": "# Second Page\n\nFoo"},
+                           test={'templates': True})
+    assert project.success
+    profile = project.template_profile
+    print(profile.templates)
+    main = profile.templates['main.html']
+    assert main.calls == 2
+    assert main.total > 0 and main.load > 0
+    assert profile.templates['404.html'].calls == 1
+    assert 'base.html' in profile.templates
+    assert set(profile.pages) == {'index.md', 'second.md'}
+    assert profile.bytecode_cache is None
+    for page in project.pages.values():
+        assert page.render_time == profile.pages[page.file.src_uri]
+
+    h2("Bytecode cache")
+    configure(project, test={'bytecode_cache': True})
+    project.build(mode='inprocess')
+    cache = project.template_profile.bytecode_cache
+    assert cache.hits == 0 and cache.misses > 0
+    assert cache.saved == 0
+    project.build(mode='subprocess')
+    assert project.success
+    cache = project.template_profile.bytecode_cache
+    print(cache)
+    assert cache.misses == 0 and cache.hits > 0
+    assert cache.saved > 0
+    assert project.get_page('index').find_text('hello world')
+
+    h2("Not profiled")
+    configure(project)
+    project.build(mode='inprocess')
+    assert not project.template_profile
+    assert project.get_page('index').render_time is None
+
+
+def test_markdown_profile(tmp_path):
+    "The processors of the markdown extensions are profiled"
+    table = "| a | b |\n| - | - |\n" + "| 1 | 2 |\n" * 200
+    project = make_project(tmp_path, "markdown_profile", mode=None,
+                           pages={"tables.md": "# Tables\n\n" + table},
+                           markdown_extensions=['tables', 'toc'],
+                           test={'markdown_profile': True})
+    for mode in ('subprocess', 'inprocess'):
+        h2(f"Markdown profile ({mode})")
+        project.build(mode=mode)
+        assert project.success
+        page = project.get_page('tables')
+        profile = page.markdown_profile
+        assert set(profile) == {'preprocessors', 'blockprocessors', 
+                                'inlinepatterns', 'treeprocessors', 
+                                'postprocessors'}
+        assert profile.blockprocessors.table > 0
+        assert profile.treeprocessors.toc > 0
+        assert 'profiler' not in profile.preprocessors
+        # the processors of MkDocs are profiled too
+        assert 'mkdocs_extract_title' in profile.treeprocessors
+        ranking = project.markdown_ranking
+        print(ranking[:5])
+        assert [item.total for item in ranking] == sorted(
+                    (item.total for item in ranking), reverse=True)
+        table = next(item for item in ranking if item.name == 'table')
+        assert table.registry == 'blockprocessors'
+        assert table.module == 'markdown.extensions.tables'
+        assert table.pages == 2
+        assert table.slowest_page == 'tables.md'
+        assert page.find_text('a')
+
+    h2("Not profiled")
+    configure(project, markdown_extensions=['tables', 'toc'])
+    project.build(mode='inprocess')
+    assert not project.markdown_ranking
+    assert project.get_page('tables').markdown_profile is None
+
+
+def test_profile(tmp_path):
+    "The build is run under cProfile"
+    hooks = ("def spin():\n"
+             "    return sum(i * i for i in range(200_000))\n"
+             "def on_page_markdown(markdown, page, config, files):\n"
+             "    spin()\n"
+             "    return markdown\n")
+    project = make_project(tmp_path, "profile", mode=None, hooks=hooks)
+    for mode in ('subprocess', 'inprocess', 'fork'):
+        h2(f"Profile ({mode})")
+        project.build(mode=mode, profile=True)
+        assert project.success
+        assert os.path.isfile(project.profile_file)
+        hotspots = project.profile_hotspots(n=10)
+        assert len(hotspots.cumulative) == len(hotspots.self) == 10
+        print([(item.function, item.package) for item in hotspots.self[:5]])
+        packages = [item.package for item in hotspots.packages]
+        assert {'mkdocs', 'markdown', 'jinja2', 'project'} <= set(packages)
+        spin = next(item for item in project.profile_hotspots(n=500).cumulative 
+                    if item.function == 'spin')
+        assert spin.package == 'project'
+        assert spin.cumtime > 0.01
+        assert hotspots.total >= spin.cumtime
+
+    h2("Failed build")
+    configure(project, hooks=hooks, nav=['missing.md'])
+    project.build(strict=True, profile=True)
+    assert not project.success
+    assert os.path.isfile(project.profile_file)
+
+    h2("Not profiled")
+    project.build(mode='inprocess')
+    with pytest.raises(FileNotFoundError):
+        project.profile_hotspots()
+
+
+def test_sqlite_store(tmp_path):
+    "Queries and full-text search on the SQLite store of the pages"
+    project = make_project(tmp_path, "sqlite",
+                           pages={"first.md": ("# First Page", {'foo': 'bar'}),
+                                  "other/second.md": "# Second Page\n\n"
+                                  "## Fruits\n\nApples and oranges."},
+                           test={'sqlite': True})
+    assert project.success
+
+    rows = project.query("SELECT src_uri, title, meta, size FROM pages "
+                         "ORDER BY src_uri")
+    assert [row.src_uri for row in rows] == ['first.md', 'index.md', 
+                                             'other/second.md']
+    assert json.loads(rows[0].meta) == {'foo': 'bar'}
+    assert all(row.size > 0 for row in rows)
+
+    found = project.search('oranges')
+    assert [row.src_uri for row in found] == ['other/second.md']
+    assert '[oranges]' in found[0].snippet.lower()
+    assert not project.search('bananas')
+    page = project.pages[found[0].src_uri]
+    assert page.find_text('oranges', header='fruits')
+
+    h2("Page deleted, in an incremental build")
+    os.remove(os.path.join(project.docs_dir, 'other', 'second.md'))
+    project.build(mode='inprocess', incremental=True)
+    assert '--dirty' in project.build_result.args
+    rows = project.query("SELECT src_uri FROM pages ORDER BY src_uri")
+    assert [row.src_uri for row in rows] == ['first.md', 'index.md']
+    assert not project.search('oranges')
+
+
+def test_grep(tmp_path):
+    "Site-wide search in the html, markdown and text of the pages"
+    pages = {f"page{i:03}.md": f"# Page {i}\n\n"
+                               + ("Value: {{ x }}" if i % 10 == 3 else "Value: 5")
+                               + "\n\nHello <em>World</em>!"
+             for i in range(PARALLEL_THRESHOLD + 6)}
+    pages["summer.md"] = "# Summer\n\nété"
+    project = make_project(tmp_path, "grep", pages=pages)
+    assert project.success
+
+    # leftover macros (regex), in parallel
+    hits = project.grep(r'\{\{', in_='markdown')
+    assert len(hits) == 7
+    assert hits[0][0].file.src_uri == 'page003.md'
+    assert hits[0][1] == 'Value: {{ x }}'
+    assert len(project.grep(r'\{\{', in_='html', workers=2)) == 7
+
+    # plain text (literal) and the same search in the current process
+    hits = project.grep('value: 5', in_='text')
+    assert len(hits) == len(project.pages) - 9
+    assert project.grep('value: 5', in_='text', workers=1) == hits
+    # (not in the pages where 'world' is emphasized)
+    assert [page.file.src_uri 
+            for page, _ in project.grep('hello world', in_='text')] == ['index.md']
+    assert project.grep('<em>world</em>', in_='html')
+    assert not project.grep('not there', in_='text')
+
+    # one line at a time (anchors, spaces), and not only ASCII
+    assert len(project.grep(r'^value: 5$', in_='markdown')) == len(hits)
+    assert not project.grep(r'value:\s+5\s+hello', in_='html')
+    assert (len(project.grep(r'^<p>hello <em>world</em>!</p></div>$', in_='html')) 
+            == len(project.pages) - 2)
+    assert project.grep('ÉTÉ', in_='html')[0][1] == '<p>été</p></div>'
+
+    with pytest.raises(ValueError):
+        project.grep('foo', in_='foo')
@@ -5,12 +5,17 @@ Testing the tester
 """
 import pytest
 import os
+import json
+import signal
 
 
-from mkdocs_test import DocProject, parse_log, list_doc_projects
+from mkdocs_test import (DocProject, parse_log, iter_log, LogIndex, LogEntry,
+                         list_doc_projects,
+                         get_build_server, build_all)
 from mkdocs_test.common import (
         h1, h2, h3, std_print, 
-        get_tables, list_markdown_files, find_in_html, find_page)
+        get_tables, list_markdown_files, find_in_html, find_page,
+        PageLookup, AmbiguousPageError)
 
 
 # ---------------------------
@@ -98,6 +103,50 @@ INFO    -  [macros - MAIN] - This means `on_post_build(env)` works
 """
     log = parse_log(TEST_CODE)
     print(log)
+    assert [entry.severity for entry in log] == ['DEBUG', 'INFO', 'DEBUG',
+                    'DEBUG', 'WARNING', 'DEBUG', 'FOOBAR', 'DEBUG', 'INFO']
+    entry = log[4]
+    assert entry.source == 'macros'
+    assert entry.title == 'ERROR # _Macro Rendering Error_'
+    assert entry.payload.startswith('_File_: `second.md`')
+    assert entry.payload.endswith('line 665, in render')
+    assert log[-1].source == 'macros - MAIN'
+    assert log[0].source == '' and log[6].payload == 'Payload here.'
+    # generator
+    assert list(iter_log(TEST_CODE)) == log
+    # dictionary-style access
+    assert entry['title'] == entry.title
+    assert entry.get('foo') is None
+    assert dict(entry)['source'] == 'macros'
+    assert 'title' in entry and 'foo' not in entry
+    assert list(entry) == ['severity', 'source', 'title', 'payload']
+    assert len(entry) == 4
+    entry['title'] = 'New title'
+    assert entry.title == 'New title'
+    entry['foo'] = 'bar'
+    assert entry['foo'] == 'bar' and 'foo' in entry and len(entry) == 5
+    assert json.loads(json.dumps(dict(entry)))['foo'] == 'bar'
+    # (as the dictionaries of previous versions)
+    assert entry.foo == 'bar'
+    with pytest.raises(AttributeError):
+        entry.bar
+    assert entry == {'severity': 'WARNING', 'source': 'macros',
+                     'title': 'New title', 'payload': entry.payload,
+                     'foo': 'bar'}
+    assert entry != log[3] and entry.to_dict() == dict(entry)
+    assert json.loads(json.dumps(log, default=LogEntry.to_dict))[4]['foo'] == 'bar'
+
+    # index of the log
+    index = LogIndex(log)
+    assert index.counts() == {'DEBUG': 5, 'INFO': 2, 'WARNING': 1, 'FOOBAR': 1}
+    assert index.counts('source') == {'': 5, 'macros': 3, 'macros - MAIN': 1}
+    assert list(index.find(source='MACROS')) == [1, 2, 4, 8]
+    assert list(index.find(source='main')) == [8]
+    assert list(index.find('copying', severity='debug')) == [5, 7]
+    assert list(index.find('page', source='macros', severity='debug')) == [2]
+    assert list(index.find('foo', severity='error')) == []
+    with pytest.raises(ValueError):
+        index.counts('title')
 
 
 
@@ -144,6 +193,21 @@ def test_find_pages():
     # doesn't accidentally mismatch directory:
     assert find_page('foo/bar.md', PAGES)     != 'no_foo/bar.md'
 
+    # same with the index of the names
+    lookup = PageLookup(PAGES)
+    assert lookup.find('foo.md')              == 'foo.md'
+    assert lookup.find('foo')                 == 'foo.md'
+    assert lookup.find('world')               == 'hello/world.md'
+    assert lookup.find('hello/world')         == 'hello/world.md'
+    assert lookup.find('foo/bar.md')          == 'foo/bar.md'
+    assert lookup.find('baz')                 is None
+    assert lookup.find_many(['world', 'baz']) == ['hello/world.md', None]
+    # ambiguous partial names are reported
+    with pytest.raises(AmbiguousPageError) as e:
+        lookup.find_many(['foo', 'bar', 'bar.md'])
+    assert list(e.value.candidates) == ['bar', 'bar.md']
+    assert e.value.candidates['bar'] == ['no_foo/bar.md', 'foo/bar.md']
+
     
 
 def test_doc_project():
@@ -189,6 +253,97 @@ def test_doc_project():
 
 
 
+def test_build_inprocess():
+    """
+    Test the in-process build (same surface as the subprocess build)
+    """
+    PROJECT_NAME = 'simple'
+    h1(f"IN-PROCESS BUILD ({PROJECT_NAME})")
+    myproject = DocProject(PROJECT_NAME)
+
+    h2("Subprocess build (reference)")
+    myproject.build()
+    assert myproject.success
+    ref_pages = {key: page.markdown for key, page in myproject.pages.items()}
+    ref_entry = myproject.find_entry('debug file', source='test')
+
+    h2("In-process build")
+    result = myproject.build(mode='inprocess')
+    assert result == myproject.build_result
+    assert myproject.success
+    myproject.self_check()
+    assert myproject.trace == result.stderr
+    std_print(myproject.trace)
+    assert "Documentation built" in myproject.trace
+    assert {key: page.markdown 
+            for key, page in myproject.pages.items()} == ref_pages
+    entry = myproject.find_entry('debug file', source='test')
+    assert entry.severity == entry['severity'] == 'INFO'
+    assert entry.title == ref_entry.title
+
+    with pytest.raises(ValueError):
+        myproject.build(mode='foo')
+
+
+def test_build_fork():
+    """
+    Test the build through the fork server (same results as subprocess)
+    """
+    h1("FORK SERVER BUILDS")
+    for project_name in PROJECTS:
+        h2(f"Project: {project_name}")
+        myproject = DocProject(project_name)
+        myproject.build()
+        ref_success = myproject.success
+        ref_pages = {key: page.markdown for key, page in myproject.pages.items()}
+        ref_entries = [(entry.severity, entry.source) for entry in myproject.log]
+
+        # twice, to make sure that nothing leaks from a build to the next
+        for _ in range(2):
+            myproject.build(mode='fork')
+            assert myproject.success == ref_success
+            assert {key: page.markdown 
+                    for key, page in myproject.pages.items()} == ref_pages
+            assert [(entry.severity, entry.source) 
+                    for entry in myproject.log] == ref_entries
+        assert get_build_server().is_running
+
+    h2("The server died: it is restarted")
+    server = get_build_server()
+    os.kill(server._pid, signal.SIGKILL)
+    myproject.build(mode='fork')
+    assert myproject.success == ref_success
+    assert server.is_running
+
+
+def test_build_all():
+    """
+    Build all projects at once (process pool)
+    """
+    h1("BUILD ALL PROJECTS")
+    reports = build_all(PROJECTS, workers=2)
+    assert len(reports) == len(PROJECTS)
+    for project_name, report in zip(PROJECTS, reports):
+        print(f"{project_name}: {report.returncode} ({report.duration:.2f}s)")
+        assert report.project_dir.endswith(project_name)
+        assert report.success
+        assert any(entry.source == 'test' for entry in report.log)
+        # the duration was recorded, for the next scheduling
+        project = DocProject(project_name)
+        assert project.build_info.duration > 0
+        assert project.pages
+
+    h2("Duplicates, DocProject objects and failures")
+    project = DocProject(PROJECTS[0])
+    reports = build_all([project, PROJECTS[0], 'missing_project'], workers=2)
+    assert reports[0] is reports[1] and reports[0].success
+    # the object was built as such
+    assert project.success and project.pages
+    report = reports[2]
+    assert not report.success and report.returncode is None
+    assert 'FileNotFoundError' in report.error and report.log == []
+    with pytest.raises(ValueError):
+        build_all(PROJECTS, mode='inprocess')
 
 
 
@@ -3,7 +3,13 @@ Various tests
 
 (C) Laurent Franceschetti 2025
 """
-from mkdocs_test.common import strip_ansi_colors
+import pytest
+from bs4 import BeautifulSoup
+
+from mkdocs_test.common import (strip_ansi_colors, get_sections,
+                                find_in_sections, find_in_html,
+                                parse_html, set_html_parser, get_html_parser,
+                                get_headers, PYTHON_PARSER, LXML_PARSER)
 
 
 def test_strip_colors():
@@ -14,4 +20,116 @@ def test_strip_colors():
     clean_text = strip_ansi_colors(colored_text)
     assert isinstance(clean_text, str)
     assert FIND not in clean_text
-    print(clean_text)  # Output: This is red and this is normal
\ No newline at end of file
+    print(clean_text)  # Output: This is red and this is normal
+
+def test_sections():
+    "Index of the sections of an HTML page"
+    HTML_DOC = """
+    <html><body>
+    <h1 id="main">Main Header</h1>
+    <p>This is some text under the main header.</p>
+    <h2 id="sub">Sub <em>Header</em></h2>
+    <p>Text under the sub header.</p>
+    <div><h3>Nested header</h3><p>Nested text</p></div>
+    <h1>Another Main Header</h1>
+    <p>Text under another main header.</p>
+    </body></html>
+    """
+    soup = BeautifulSoup(HTML_DOC, 'html.parser')
+    sections = get_sections(soup)
+    assert [(s.level, s.id, s.title) for s in sections] == [
+        (1, 'main', 'Main Header'), (2, 'sub', 'Sub Header'),
+        (3, None, 'Nested header'), (1, None, 'Another Main Header')]
+    assert sections[1].text == 'Text under the sub header.\nNested header\nNested text'
+
+    # same results as before
+    for pattern, header, level in [('under the', 'sub header', None),
+                                   ('under the', 'main header', 1),
+                                   ('nested', 'sub', 2),
+                                   ('nested', 'nested', None),
+                                   ('under the', 'sub header', 1),
+                                   ('missing', None, None)]:
+        expected = find_in_html(HTML_DOC, pattern, header=header,
+                                header_level=level)
+        assert find_in_sections(sections, soup.get_text('\n', strip=True),
+                                pattern, header=header,
+                                header_level=level) == expected
+    assert find_in_html(HTML_DOC, 'under another', 
+                        header='main header') == 'Text under another main header.'
+    assert find_in_html(HTML_DOC, 'under the', header='sub header', 
+                        header_level=1) is None
+
+
+def test_html_parsers():
+    "The HTML parsers give the same results"
+    HTML_DOC = """
+    <h1 id="main">Main Header</h1>
+    <p>This is some text under the main header.</p>
+    <h2 id="sub">Sub Header</h2>
+    <p>Text under the sub header.</p>
+    """
+    for parser in (PYTHON_PARSER, LXML_PARSER):
+        soup = parse_html(HTML_DOC, parser)
+        assert [section.title for section in get_sections(soup)] == [
+            'Main Header', 'Sub Header']
+        assert soup.find('h2')['id'] == 'sub'
+        assert find_in_html(HTML_DOC, 'under the', header='sub',
+                            parser=parser) == 'Text under the sub header.'
+
+    # default parser
+    assert get_html_parser() == PYTHON_PARSER
+    set_html_parser(LXML_PARSER)
+    try:
+        assert get_html_parser() == LXML_PARSER
+        assert find_in_html(HTML_DOC, 'main header') == 'Main Header'
+    finally:
+        set_html_parser(PYTHON_PARSER)
+    with pytest.raises(ValueError):
+        set_html_parser('foo')
+    assert get_html_parser() == PYTHON_PARSER
+
+
+def test_markdown_headers():
+    "Headers of a markdown text (with their lines)"
+    MARKDOWN = """# Title
+
+Text
+
+Subtitle
+--------
+
+```python
+# not a header
+```
+
+Another title
+=============
+
+### Level three
+"""
+    assert get_headers(MARKDOWN) == [(1, 1), (5, 2), (12, 1), (15, 3)]
+
+
+def test_event_timer_origins():
+    "The handlers are timed, even if MkDocs does not record their origin"
+    from mkdocs_test.profiling import EventTimer
+
+    class MyPlugin:
+        def on_page_markdown(self, markdown, **kwargs):
+            return markdown
+
+    def on_config(config):
+        return config
+
+    class Plugins:
+        "A collection of plugins, without _event_origins (MkDocs < 1.6)"
+        events = {'page_markdown': [MyPlugin().on_page_markdown],
+                  'config': [on_config]}
+
+    timer = EventTimer()
+    timer.instrument(Plugins)
+    assert Plugins.events['page_markdown'][0]('foo') == 'foo'
+    Plugins.events['config'][0]({})
+    timings = timer.summary()
+    assert timings['MyPlugin']['on_page_markdown']['calls'] == 1
+    assert timings[__name__]['on_config']['calls'] == 1